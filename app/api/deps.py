@@ -4,9 +4,9 @@ from sqlalchemy import select
 from sqlalchemy.exc import MultipleResultsFound
 
 from app.db.session import get_db
-from app.models.client import Client
 from app.models.user import User
 from app.core.tokens import decode_access
+from app.services.tenants import TenantSnapshot, get_tenant_snapshot
 
 # ----------------------------------------------------------------------
 # Lê o Bearer do header Authorization (sem usar OAuth2PasswordBearer)
@@ -20,14 +20,11 @@ def get_bearer_token(authorization: str = Header(None, alias="Authorization")) -
     return parts[1]
 
 # ----------------------------------------------------------------------
-# Tenant tolerante a duplicados de slug (pega o de maior id)
+# Tenant tolerante a duplicados de slug (pega o de maior id), em cache por
+# slug (services/tenants): a rota recebe um TenantSnapshot, não o Client da sessão
 # ----------------------------------------------------------------------
-def get_tenant(tenant: str, db: Session = Depends(get_db)) -> Client:
-    stmt = select(Client).where(Client.slug == tenant)
-    try:
-        row = db.execute(stmt).scalar_one_or_none()
-    except MultipleResultsFound:
-        row = db.scalars(stmt.order_by(Client.id.desc()).limit(1)).first()
+def get_tenant(tenant: str, db: Session = Depends(get_db)) -> TenantSnapshot:
+    row = get_tenant_snapshot(db, tenant)
     if not row:
         raise HTTPException(status_code=404, detail="Tenant não encontrado")
     return row
@@ -38,7 +35,7 @@ def get_tenant(tenant: str, db: Session = Depends(get_db)) -> Client:
 def get_current_user_scoped(
     token: str = Depends(get_bearer_token),   # <-- antes estava Depends(...)
     db: Session = Depends(get_db),
-    tenant: Client = Depends(get_tenant),
+    tenant: TenantSnapshot = Depends(get_tenant),
 ) -> User:
     payload = decode_access(token)
     email = (payload.get("sub") or "").lower()
@@ -54,3 +51,12 @@ def get_current_user_scoped(
     if not user:
         raise HTTPException(status_code=401, detail="Usuário não encontrado no tenant")
     return user
+
+# ----------------------------------------------------------------------
+# Rotas de streaming: o teardown das dependências com yield (get_db) só roda
+# depois que a resposta termina de ser enviada. Fechar a sessão da requisição
+# (a mesma de get_tenant/get_current_user_scoped, pelo cache de dependências)
+# devolve a conexão ao pool antes do stream; o close do teardown vira no-op.
+# ----------------------------------------------------------------------
+def release_db(db: Session) -> None:
+    db.close()
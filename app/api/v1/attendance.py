@@ -1,56 +1,134 @@
 from __future__ import annotations
-from typing import Optional, List
+import asyncio
+import csv
+import io
+import json
+from typing import Iterator, Optional, List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import select, and_
 from sqlalchemy.orm import Session, joinedload
 
-from app.api.deps import get_db, get_tenant, get_current_user_scoped
+from app.api.deps import get_db, get_tenant, get_current_user_scoped, release_db
 from app.core.rbac import require_roles
+from app.db.session import SessionLocal
 from app.models.attendance import Attendance
 from app.models.enrollment import Enrollment
 from app.models.day_event import DayEvent
 from app.models.event import Event
+from app.models.student import Student
 from app.schemas.attendance import AttendanceOut
+from app.services.projection import entities, parse_fields, projected_select, rows_to_dicts
+from app.services.occupancy import broker, get_counters, reconcile_counters
+from app.services.roster import get_roster
 
 router = APIRouter()
 
-# GET /{tenant}/attendance?event_id=..&day_id=..&student_id=..
+# campos disponíveis em ?fields= e na exportação (nome de saída -> coluna)
+ATTENDANCE_FIELDS = {
+    "id": Attendance.id,
+    "checkin_at": Attendance.checkin_at,
+    "checkout_at": Attendance.checkout_at,
+    "origin": Attendance.origin,
+    "day_event_id": DayEvent.id,
+    "day_date": DayEvent.date,
+    "enrollment_id": Enrollment.id,
+    "enrollment_status": Enrollment.status,
+    "student_id": Student.id,
+    "student_name": Student.name,
+    "student_email": Student.email,
+    "student_ra": Student.ra,
+    "event_id": Event.id,
+    "event_title": Event.title,
+}
+
+def _filtered(stmt, tenant, event_id: Optional[int], day_id: Optional[int], student_id: Optional[int]):
+    stmt = stmt.where(Event.client_id == tenant.id)
+    conds = []
+    if event_id is not None:
+        conds.append(Enrollment.event_id == event_id)
+    if day_id is not None:
+        conds.append(Attendance.day_event_id == day_id)
+    if student_id is not None:
+        conds.append(Enrollment.student_id == student_id)
+    if conds:
+        stmt = stmt.where(and_(*conds))
+    return stmt
+
+def _projection_stmt(names: List[str]):
+    """SELECT só das colunas pedidas; Student/DayEvent entram no JOIN apenas se usados."""
+    used = entities(ATTENDANCE_FIELDS, names)
+    stmt = (
+        projected_select(ATTENDANCE_FIELDS, names)
+        .select_from(Attendance)
+        .join(Enrollment, Enrollment.id == Attendance.enrollment_id)
+        .join(Event, Event.id == Enrollment.event_id)
+    )
+    if Student in used:
+        stmt = stmt.join(Student, Student.id == Enrollment.student_id)
+    if DayEvent in used:
+        stmt = stmt.join(DayEvent, DayEvent.id == Attendance.day_event_id)
+    return stmt
+
+# GET /{tenant}/attendance?event_id=..&day_id=..&student_id=..&cursor=..&limit=..&fields=..
 @router.get("/", response_model=List[AttendanceOut],
             dependencies=[Depends(require_roles("admin", "organizer", "portaria"))])
 def list_attendance(
+    response: Response,
     event_id: Optional[int] = None,
     day_id: Optional[int] = None,
     student_id: Optional[int] = None,
+    cursor: Optional[int] = Query(None, ge=0, description="id da última presença da página anterior (keyset)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamanho da página; sem limit devolve tudo"),
+    fields: Optional[str] = Query(None, description="Projeção plana, ex.: id,checkin_at,student_name"),
     db: Session = Depends(get_db),
     tenant = Depends(get_tenant),
     _user = Depends(get_current_user_scoped),
 ):
-    # Eager load: enrollment -> student, event; day_event
-    stmt = (
-        select(Attendance)
-        .join(Attendance.enrollment)
-        .join(Enrollment.event)
-        .join(Attendance.day_event)
-        .where(Event.client_id == tenant.id)
-        .options(
-            joinedload(Attendance.enrollment).joinedload(Enrollment.student),
-            joinedload(Attendance.enrollment).joinedload(Enrollment.event),
-            joinedload(Attendance.day_event),
+    try:
+        names = parse_fields(fields, ATTENDANCE_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if names is not None:
+        # projeção: linhas Core direto para dict, sem ORM/identity map/Pydantic;
+        # Attendance.id vai no fim da linha para o cursor do keyset
+        stmt = _projection_stmt(names).add_columns(Attendance.id)
+    else:
+        # Eager load: enrollment -> student, event; day_event
+        stmt = (
+            select(Attendance)
+            .join(Attendance.enrollment)
+            .join(Enrollment.event)
+            .join(Attendance.day_event)
+            .options(
+                joinedload(Attendance.enrollment).joinedload(Enrollment.student),
+                joinedload(Attendance.enrollment).joinedload(Enrollment.event),
+                joinedload(Attendance.day_event),
+            )
         )
-    )
+    stmt = _filtered(stmt, tenant, event_id, day_id, student_id)
 
-    conds = []
-    if event_id is not None:
-        conds.append(Enrollment.event_id == event_id)
-    if day_id is not None:
-        conds.append(Attendance.day_event_id == day_id)
-    if student_id is not None:
-        conds.append(Enrollment.student_id == student_id)
-    if conds:
-        stmt = stmt.where(and_(*conds))
+    # paginação por keyset em (id): WHERE id > cursor ORDER BY id LIMIT n
+    stmt = stmt.order_by(Attendance.id)
+    if cursor is not None:
+        stmt = stmt.where(Attendance.id > cursor)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    if names is not None:
+        tuples = db.execute(stmt).all()
+        headers = {}
+        if limit is not None and len(tuples) == limit:
+            headers["X-Next-Cursor"] = str(tuples[-1][-1])
+        return JSONResponse(jsonable_encoder(rows_to_dicts(tuples, names)), headers=headers)
 
     rows = db.scalars(stmt).all()
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
 
     # Se status vier como Enum, converto para string antes de validar
     for a in rows:
@@ -59,3 +137,159 @@ def list_attendance(
 
     # Pydantic a partir do ORM (graças ao from_attributes)
     return [AttendanceOut.model_validate(a) for a in rows]
+
+# ------------------------ exportação em streaming ------------------------
+
+EXPORT_BATCH = 1000
+
+_EXPORT_FIELDS = list(ATTENDANCE_FIELDS)
+
+def _export_stmt(tenant, event_id, day_id, student_id):
+    stmt = _projection_stmt(_EXPORT_FIELDS).order_by(Attendance.id)
+    return _filtered(stmt, tenant, event_id, day_id, student_id)
+
+def _export_value(v):
+    if hasattr(v, "value"):       # Enum
+        return v.value
+    if hasattr(v, "isoformat"):   # date/datetime
+        return v.isoformat()
+    return v
+
+def _export_rows(stmt, fmt: str) -> Iterator[str]:
+    # sessão própria: o gerador roda depois que o endpoint retornou
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(_EXPORT_FIELDS)
+            for part in result.partitions():
+                writer.writerows([_export_value(v) for v in row] for row in part)
+                yield buf.getvalue()
+                buf.seek(0); buf.truncate()
+            if buf.tell():
+                yield buf.getvalue()
+        else:
+            for part in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(_EXPORT_FIELDS, (_export_value(v) for v in row)))) + "\n"
+                    for row in part
+                )
+
+# GET /{tenant}/attendance/export?format=ndjson|csv&event_id=..&day_id=..&student_id=..
+@router.get("/export",
+            dependencies=[Depends(require_roles("admin", "organizer", "portaria"))])
+def export_attendance(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    event_id: Optional[int] = None,
+    day_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _user = Depends(get_current_user_scoped),
+):
+    """
+    Exporta as presenças linha a linha (NDJSON ou CSV), lendo do banco em
+    lotes de EXPORT_BATCH via yield_per — a lista completa nunca fica em memória.
+    """
+    release_db(db)  # o gerador usa sessão própria; a da autenticação não fica presa
+    stmt = _export_stmt(tenant, event_id, day_id, student_id)
+    if format == "csv":
+        media, ext = "text/csv; charset=utf-8", "csv"
+    else:
+        media, ext = "application/x-ndjson", "ndjson"
+    return StreamingResponse(
+        _export_rows(stmt, format),
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="attendance.{ext}"'},
+    )
+
+# ------------------------ ocupação ao vivo (SSE) ------------------------
+
+SSE_KEEPALIVE_SECONDS = 15  # também o intervalo de ressincronização dos contadores
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _require_day(db: Session, tenant, day_id: int) -> None:
+    roster = get_roster(db, day_id)
+    if roster is None or roster.client_id != tenant.id:
+        raise HTTPException(status_code=404, detail="Dia do evento não encontrado")
+
+def _day_snapshot(db: Session, tenant, day_id: int) -> dict:
+    _require_day(db, tenant, day_id)
+    return get_counters(db, day_id)
+
+def _read_counters(day_id: int) -> dict:
+    with SessionLocal() as db:
+        return get_counters(db, day_id)
+
+# GET /{tenant}/attendance/days/{day_id}/occupancy
+@router.get("/days/{day_id}/occupancy",
+            dependencies=[Depends(require_roles("admin", "organizer", "portaria"))])
+def day_occupancy(
+    day_id: int,
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _user = Depends(get_current_user_scoped),
+):
+    return {"day_event_id": day_id, "counts": _day_snapshot(db, tenant, day_id)}
+
+# POST /{tenant}/attendance/days/{day_id}/occupancy/reconcile
+@router.post("/days/{day_id}/occupancy/reconcile",
+             dependencies=[Depends(require_roles("admin", "organizer"))])
+def reconcile_day_occupancy(
+    day_id: int,
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _user = Depends(get_current_user_scoped),
+):
+    """Reconstrói os contadores do dia a partir das linhas de attendances."""
+    _require_day(db, tenant, day_id)
+    reconcile_counters(db, [day_id])
+    return {"day_event_id": day_id, "counts": get_counters(db, day_id)}
+
+# GET /{tenant}/attendance/days/{day_id}/stream  (text/event-stream)
+@router.get("/days/{day_id}/stream",
+            dependencies=[Depends(require_roles("admin", "organizer", "portaria"))])
+async def stream_day_occupancy(
+    day_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _user = Depends(get_current_user_scoped),
+):
+    """
+    Eventos incrementais de um DayEvent: `counts` (na conexão, em resync e a
+    cada keep-alive, lido de day_event_counters), `checkin`, `checkout` e
+    `delete` (presença removida), com delta e contadores correntes.
+    Alimentado pelo commit das gravações de presença neste processo; o
+    `counts` periódico cobre os outros workers.
+    """
+    snapshot = await run_in_threadpool(_day_snapshot, db, tenant, day_id)
+    release_db(db)  # nada do pool fica preso enquanto o painel estiver aberto
+
+    async def _events():
+        q = broker.subscribe(day_id, snapshot)
+        try:
+            yield _sse("counts", {"day_event_id": day_id, "counts": broker.counts(day_id) or snapshot})
+            while not await request.is_disconnected():
+                try:
+                    msg = await asyncio.wait_for(q.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    counts = await run_in_threadpool(_read_counters, day_id)
+                    broker.reset_counts(day_id, counts)
+                    yield _sse("counts", {"day_event_id": day_id, "counts": counts})
+                    continue
+                if msg["type"] == "resync":
+                    yield _sse("counts", {"day_event_id": day_id, "counts": broker.counts(day_id)})
+                else:
+                    yield _sse(msg["type"], msg)
+        finally:
+            broker.unsubscribe(day_id, q)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
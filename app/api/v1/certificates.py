@@ -1,13 +1,16 @@
 # app/api/v1/certificates.py
 from __future__ import annotations
 
-from typing import List, Optional
+import re
+from typing import Iterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select, and_
 from app.models.user import User
-from app.api.deps import get_db, get_tenant, get_current_user_scoped
+from app.api.deps import get_db, get_tenant, get_current_user_scoped, release_db
+from app.db.session import SessionLocal
 from app.core.rbac import require_roles
 from app.core.config import settings
 
@@ -16,13 +19,24 @@ from app.models.event import Event
 from app.models.enrollment import Enrollment
 from app.models.student import Student
 from app.models.certificate import Certificate
+from app.models.certificate_job import CertificateJob
 
 from app.schemas.certificate import Certificate as CertificateOut  # seu schema
 from app.services.certificates import (
+    ensure_certificate_pdf,
     issue_certificate_for_enrollment,
     compute_presence_stats,
-    is_eligible,
 )
+from app.services.eligibility import (
+    eligible_enrollment_ids,
+    enrollment_eligibility,
+    presence_eligibility,
+)
+from app.services.certificate_jobs import create_job, job_to_dict, submit_job
+from app.services.verify_codes import check_code, new_verify_codes
+from app.services.storage import get_storage
+from app.services.verification import get_verification
+from app.services.zip_stream import ZipEntry, safe_name, stream_zip
 
 router = APIRouter()
 verify_router = APIRouter()  # público
@@ -55,9 +69,54 @@ def check_eligibility(
     enr = db.get(Enrollment, enrollment_id)
     if not enr:
         raise HTTPException(status_code=404, detail="Enrollment not found")
-    ok, stats, req = is_eligible(db, enr, mode=mode)
+    # leitura de enrollment_presence (mantida a cada presença gravada)
+    ok, stats, req = enrollment_eligibility(db, enr, mode=mode)
     return {"eligible": ok, "required_pct": req, "stats": stats}
 
+@router.get("/eligibility/event/{event_id}",
+            dependencies=[Depends(require_roles("admin", "organizer"))])
+def event_eligibility_report(
+    event_id: int = Path(..., ge=1),
+    mode: str = Query("day", pattern="^(day|hours)$"),
+    eligible_only: bool = Query(False, description="Só as inscrições elegíveis"),
+    db: Session = Depends(get_db),
+    tenant: Client = Depends(get_tenant),
+    _ = Depends(get_current_user_scoped),
+):
+    """Elegibilidade das inscrições do evento, lida de enrollment_presence (sem recálculo por aluno)."""
+    ev = db.get(Event, event_id)
+    if not ev or ev.client_id != tenant.id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    stmt = (
+        select(Enrollment.id, Enrollment.student_id, Student.name)
+        .join(Student, Student.id == Enrollment.student_id)
+        .where(Enrollment.event_id == event_id)
+        .order_by(Enrollment.id)
+    )
+    if eligible_only:
+        stmt = stmt.where(Enrollment.id.in_(eligible_enrollment_ids(db, ev, mode=mode)))
+    rows = db.execute(stmt).all()
+    elig = presence_eligibility(db, ev, mode=mode, enrollment_ids=[r[0] for r in rows])
+    items = []
+    for enr_id, student_id, student_name in rows:
+        ok, stats, _req = elig[enr_id]
+        items.append({
+            "enrollment_id": enr_id,
+            "student_id": student_id,
+            "student_name": student_name,
+            "eligible": ok,
+            "stats": stats,
+        })
+    return {
+        "event_id": event_id,
+        "mode": mode,
+        "required_pct": elig[rows[0][0]][2] if rows else None,
+        "total": len(items),
+        "eligible": sum(1 for i in items if i["eligible"]),
+        "items": items,
+    }
+
 # -------------------------- emissão --------------------------
 
 @router.post("/issue/{enrollment_id}", response_model=CertificateOut,
@@ -79,6 +138,7 @@ def issue_one(
         db=db, tenant=tenant, enrollment=enr,
         verify_url_base=_verify_base(request),
         mode=mode, reissue=reissue,
+        eligibility=enrollment_eligibility(db, enr, mode=mode),
     )
     if not cert:
         raise HTTPException(status_code=412, detail="Aluno não elegível pela regra de presença")
@@ -101,19 +161,199 @@ def issue_batch(
 
     enrs = db.execute(
         select(Enrollment).where(Enrollment.event_id == event_id)
+        .options(joinedload(Enrollment.student))
     ).scalars().all()
+    elig = presence_eligibility(db, ev, mode=mode, enrollment_ids=[e.id for e in enrs])
+    codes = iter(new_verify_codes(sum(1 for ok, _s, _r in elig.values() if ok)))
 
     out: List[CertificateOut] = []
     for enr in enrs:
+        ok = elig[enr.id][0]
         cert = issue_certificate_for_enrollment(
             db=db, tenant=tenant, enrollment=enr,
             verify_url_base=_verify_base(request),
             mode=mode, reissue=reissue_existing,
+            eligibility=elig[enr.id], verify_code=next(codes) if ok else None,
         )
         if cert:
             out.append(_to_out(cert))
     return out
 
+# ----------------------- emissão em lote (job) -----------------------
+
+@router.post("/batch/{event_id}/jobs", status_code=202,
+             dependencies=[Depends(require_roles("admin", "organizer"))])
+def start_batch_job(
+    request: Request,
+    event_id: int = Path(..., ge=1),
+    mode: str = Query("day", pattern="^(day|hours)$"),
+    reissue_existing: bool = Query(False, description="Se true, revoga os ativos e reemite"),
+    db: Session = Depends(get_db),
+    tenant: Client = Depends(get_tenant),
+    current = Depends(get_current_user_scoped),
+):
+    """
+    Mesmo efeito de /batch/{event_id}, mas em background: responde na hora
+    com o id do job; acompanhe por GET /jobs/{job_id}.
+    """
+    ev = db.get(Event, event_id)
+    if not ev or ev.client_id != tenant.id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    job = create_job(db, tenant=tenant, event=ev, mode=mode,
+                     reissue=reissue_existing, user_id=getattr(current, "id", None))
+    submit_job(job.id, _verify_base(request))
+    return job_to_dict(job, include_results=False)
+
+@router.get("/jobs/{job_id}",
+            dependencies=[Depends(require_roles("admin", "organizer"))])
+def get_batch_job(
+    job_id: int = Path(..., ge=1),
+    include_results: bool = Query(True),
+    db: Session = Depends(get_db),
+    tenant: Client = Depends(get_tenant),
+    _ = Depends(get_current_user_scoped),
+):
+    job = db.get(CertificateJob, job_id)
+    if not job or job.client_id != tenant.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job, include_results=include_results)
+
+# -------------------------- download --------------------------
+
+_BYTE_RANGE = re.compile(r"(\d*)-(\d*)", re.ASCII)
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    'bytes=a-b' | 'bytes=a-' | 'bytes=-n' -> (início, fim) inclusivo.
+    None = Range ignorado, responde o arquivo inteiro (RFC 9110: unidade
+    desconhecida, vários intervalos ou sintaxe inválida, como bytes=5-3);
+    ValueError = intervalo válido, mas insatisfazível (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    m = _BYTE_RANGE.fullmatch(spec.strip())
+    if not m or not (m[1] or m[2]):
+        return None
+    if not m[1]:  # sufixo: os últimos n bytes
+        n = int(m[2])
+        if n == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - n), size - 1
+    start = int(m[1])
+    end = int(m[2]) if m[2] else size - 1
+    if m[2] and end < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+@router.get("/download/{code}")
+def download_certificate(
+    code: str = Path(..., min_length=4, max_length=64),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    tenant: Client = Depends(get_tenant),
+):
+    """
+    PDF do certificado (público: o código é a credencial, como em /verify).
+    Suporta ETag/If-None-Match (304) e Range/If-Range (206) para retomada.
+    Emitido sob demanda (CERT_LAZY_PDF): o primeiro download gera e grava o PDF.
+    """
+    if not check_code(code):  # formato/MAC inválido: recusado sem consulta
+        raise HTTPException(status_code=404, detail="Certificado não encontrado ou revogado")
+    found = db.execute(
+        select(Certificate.id)
+        .join(Enrollment, Enrollment.id == Certificate.enrollment_id)
+        .join(Event, Event.id == Enrollment.event_id)
+        .where(Certificate.verify_code == code, Certificate.status == "issued", Event.client_id == tenant.id)
+    ).first()
+    storage = get_storage()
+    obj = ensure_certificate_pdf(db, tenant, code) if found else None
+    if obj is None:
+        raise HTTPException(status_code=404, detail="Certificado não encontrado ou revogado")
+
+    headers = {
+        "ETag": obj.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f'inline; filename="certificado-{code}.pdf"',
+    }
+    if if_none_match and (if_none_match.strip() == "*" or obj.etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, obj.size - 1, 200
+    if range_header and (not if_range or if_range.strip() == obj.etag):
+        try:
+            rng = _parse_range(range_header, obj.size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{obj.size}"})
+        if rng:
+            start, end = rng
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{obj.size}"
+    headers["Content-Length"] = str(end - start + 1 if obj.size else 0)
+
+    release_db(db)  # o envio do PDF pode durar; a conexão volta ao pool antes
+    body = storage.iter_range(tenant.slug, code, start, end) if obj.size else iter(())
+    return StreamingResponse(body, status_code=status, media_type="application/pdf", headers=headers)
+
+def _bundle_entries(tenant: Client, rows) -> Iterator[ZipEntry]:
+    tenant_slug = tenant.slug
+    storage = get_storage()
+    for code, student_name, issued_at, lazy in rows:
+        obj = storage.stat(tenant_slug, code)
+        if obj is None and lazy:
+            # emitido sob demanda e nunca baixado: gera agora (e fica no storage);
+            # sessão própria, o gerador roda durante o envio da resposta
+            with SessionLocal() as db:
+                obj = ensure_certificate_pdf(db, tenant, code)
+        if obj is None:  # registro sem PDF no storage: fica de fora do pacote
+            continue
+        yield ZipEntry(
+            name=f"{safe_name(student_name, 'aluno')}-{code}.pdf",
+            size=obj.size,
+            modified=issued_at,
+            chunks=lambda code=code, size=obj.size: (
+                storage.iter_range(tenant_slug, code, 0, size - 1) if size else ()
+            ),
+        )
+
+@router.get("/event/{event_id}/bundle",
+            dependencies=[Depends(require_roles("admin", "organizer"))])
+def download_event_bundle(
+    event_id: int = Path(..., ge=1),
+    db: Session = Depends(get_db),
+    tenant: Client = Depends(get_tenant),
+    _ = Depends(get_current_user_scoped),
+):
+    """
+    ZIP com os PDFs emitidos (status issued) do evento, montado durante o
+    envio: cada PDF é lido do storage em pedaços e vai direto para a resposta.
+    PDFs ainda não gerados (emissão sob demanda) são gerados na vez deles.
+    """
+    ev = db.get(Event, event_id)
+    if not ev or ev.client_id != tenant.id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    rows = db.execute(
+        select(Certificate.verify_code, Student.name, Certificate.issued_at,
+               Certificate.render_json.is_not(None))
+        .join(Enrollment, Enrollment.id == Certificate.enrollment_id)
+        .join(Student, Student.id == Enrollment.student_id)
+        .where(Enrollment.event_id == event_id, Certificate.status == "issued")
+        .order_by(Student.name, Certificate.id)
+    ).all()
+    release_db(db)  # PDFs gerados no envio usam sessão própria (_bundle_entries)
+    return StreamingResponse(
+        stream_zip(_bundle_entries(tenant, rows)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="certificados-evento-{event_id}.zip"'},
+    )
+
 # -------------------------- leitura --------------------------
 
 @router.get("/{certificate_id}", response_model=CertificateOut)
@@ -220,24 +460,23 @@ def list_certificates_by_student(
 @verify_router.get("/{code}")
 def verify_public(
     code: str,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
-    c = db.execute(select(Certificate).where(Certificate.verify_code == code)).scalar_one_or_none()
-    if not c or c.status != "issued":
-        raise HTTPException(status_code=404, detail="Certificado não encontrado ou revogado")
-
-    enr = db.get(Enrollment, c.enrollment_id)
-    ev = db.get(Event, enr.event_id) if enr else None
-    st = db.get(Student, enr.student_id) if enr else None
-    cli = db.get(Client, ev.client_id) if ev else None
-
-    # resposta “LGPD-friendly”
-    return {
-        "status": c.status,
-        "verify_code": c.verify_code,
-        "issued_at": c.issued_at,
-        "client": {"name": cli.name, "slug": cli.slug} if cli else None,
-        "event": {"title": ev.title, "id": ev.id} if ev else None,
-        "student": {"name": st.name} if st else None,
-        "pdf_url": c.pdf_url,
+    # uma consulta com joins, em cache por código (inclusive o "não encontrado")
+    v = get_verification(db, code)
+    if v.payload is None:
+        return JSONResponse(
+            status_code=404,
+            content={"detail": "Certificado não encontrado ou revogado"},
+            headers={"Cache-Control": "no-store"},
+        )
+    # revalida sempre (If-None-Match -> 304): uma revogação não pode ficar
+    # escondida em proxy compartilhado nem no cache do navegador
+    headers = {
+        "ETag": v.etag,
+        "Cache-Control": "private, no-cache",
     }
+    if if_none_match and v.etag in {t.strip() for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=v.payload, headers=headers)
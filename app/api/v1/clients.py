@@ -6,6 +6,8 @@ from app.api.deps import get_db, get_tenant, get_current_user_scoped
 from app.core.rbac import require_roles
 from app.models.client import Client as ClientModel
 from app.schemas.client import Client as ClientOut, ClientBase, ClientUpdate
+from app.services.certificates import invalidate_client_templates
+from app.services.tenants import invalidate_slug, invalidate_tenant
 
 router = APIRouter()
 
@@ -58,6 +60,9 @@ def update_my_client(
     for k, v in data.items():
         setattr(c, k, v)
     db.add(c); db.commit(); db.refresh(c)
+    invalidate_tenant(c.id)
+    if "certificate_template_html" in data:
+        invalidate_client_templates(c.id)
     return _to_out(c)
 
 # -------- Versões REST por ID (só permitem o próprio tenant) --------
@@ -92,6 +97,9 @@ def update_client_by_id(
     for k, v in data.items():
         setattr(c, k, v)
     db.add(c); db.commit(); db.refresh(c)
+    invalidate_tenant(c.id)
+    if "certificate_template_html" in data:
+        invalidate_client_templates(c.id)
     return _to_out(c)
 
 # -------- POST global (sem tenant) para criar novo Client --------
@@ -113,4 +121,5 @@ def create_client(body: ClientBase, db: Session = Depends(get_db)):
         config_json=body.config_json or {},
     )
     db.add(c); db.commit(); db.refresh(c)
+    invalidate_slug(c.slug)
     return _to_out(c)
@@ -1,21 +1,25 @@
 # app/api/v1/enrollments.py
 from __future__ import annotations
 import secrets
-from fastapi import APIRouter, Depends, HTTPException, Query
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
 from app.api.v1.users import require_roles
 from app.api.deps import get_db, get_tenant, get_current_user_scoped
-from app.models.enrollment import Enrollment
+from app.models.enrollment import Enrollment, STATUS_CANCELED
 from app.models.student import Student
 from app.models.event import Event
+from app.services.projection import entities, parse_fields, projected_select, rows_to_dicts
+from app.core.config import settings
+from app.services.qr import build_qr_token, current_window, qr_png, qr_svg
+from app.services.roster import invalidate_event
 
 router = APIRouter()  # <<< NÃO redefinir este router em nenhum outro ponto do arquivo
 
 # ------------------------ helpers ------------------------
 
-STATUS_CANCELED = {"canceled", "cancelled"}
 STATUS_PENDING = "pending"
 STATUS_CONFIRMED = "confirmed"
 
@@ -39,6 +43,55 @@ def _enr_to_dict(enr: Enrollment) -> dict:
         "status": enr.status,
     }
 
+# campos disponíveis em ?fields= (nome de saída -> coluna)
+ENROLLMENT_FIELDS = {
+    "id": Enrollment.id,
+    "student_id": Enrollment.student_id,
+    "event_id": Enrollment.event_id,
+    "status": Enrollment.status,
+    "created_at": Enrollment.created_at,
+    "student_name": Student.name,
+    "student_email": Student.email,
+    "student_cpf": Student.cpf,
+    "student_ra": Student.ra,
+    "student_phone": Student.phone,
+    "event_title": Event.title,
+    "event_venue": Event.venue,
+    "event_start_at": Event.start_at,
+    "event_end_at": Event.end_at,
+    "event_status": Event.status,
+    "event_workload_hours": Event.workload_hours,
+}
+
+def _fields_param(raw: str | None) -> list[str] | None:
+    try:
+        return parse_fields(raw, ENROLLMENT_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _list_enrollments_projected(
+    db: Session,
+    tenant,
+    event_id: int | None,
+    status: str | None,
+    names: list[str],
+):
+    # Core: só as colunas pedidas, linhas direto para dict (sem ORM)
+    stmt = (
+        projected_select(ENROLLMENT_FIELDS, names)
+        .select_from(Enrollment)
+        .join(Event, Enrollment.event_id == Event.id)
+        .where(Event.client_id == tenant.id)
+        .order_by(Enrollment.id)
+    )
+    if Student in entities(ENROLLMENT_FIELDS, names):
+        stmt = stmt.join(Student, Enrollment.student_id == Student.id)
+    if event_id is not None:
+        stmt = stmt.where(Enrollment.event_id == event_id)
+    if status:
+        stmt = stmt.where(Enrollment.status == status)
+    return rows_to_dicts(db.execute(stmt), names)
+
 def _list_enrollments_core(
     db: Session,
     tenant,
@@ -105,10 +158,14 @@ def list_enrollments(
     event_id: int | None = Query(None, alias="event_id"),
     status: str | None = Query(None, alias="status"),
     expand: str = Query("", description="Comma-separated: student,event"),
+    fields: str | None = Query(None, description="Projeção plana, ex.: id,status,student_name (ignora expand)"),
     db: Session = Depends(get_db),
     tenant = Depends(get_tenant),
     _user = Depends(get_current_user_scoped),
 ):
+    names = _fields_param(fields)
+    if names is not None:
+        return _list_enrollments_projected(db, tenant, event_id, status, names)
     return _list_enrollments_core(db, tenant, event_id, status, _expand_param(expand))
 
 @router.get("/events/{event_id}/enrollments")
@@ -116,10 +173,14 @@ def list_enrollments_by_event(
     event_id: int,
     status: str | None = Query(None, alias="status"),
     expand: str = Query("", description="Comma-separated: student,event"),
+    fields: str | None = Query(None, description="Projeção plana, ex.: id,status,student_name (ignora expand)"),
     db: Session = Depends(get_db),
     tenant = Depends(get_tenant),
     _user = Depends(get_current_user_scoped),
 ):
+    names = _fields_param(fields)
+    if names is not None:
+        return _list_enrollments_projected(db, tenant, event_id, status, names)
     return _list_enrollments_core(db, tenant, event_id, status, _expand_param(expand))
 
 # ------------------------ endpoints: CREATE/CANCEL ------------------------
@@ -157,6 +218,7 @@ def enroll_student(
         if existing.status in STATUS_CANCELED and reactivate:
             existing.status = STATUS_PENDING
             db.add(existing); db.commit(); db.refresh(existing)
+            invalidate_event(event_id)
             return _enr_to_dict(existing)
         if existing.status not in STATUS_CANCELED:
             raise HTTPException(status_code=409, detail="already_enrolled")
@@ -183,6 +245,7 @@ def enroll_student(
         raise HTTPException(status_code=500, detail="db_error")
 
     db.refresh(enr)
+    invalidate_event(event_id)
     return _enr_to_dict(enr)
 
 # aceita POST, PUT e PATCH
@@ -203,9 +266,10 @@ def cancel_enrollment(
         raise HTTPException(status_code=404, detail="enrollment_not_found")
 
     # idempotente: se já estiver cancelado, só retorna 200 com o mesmo estado
-    if enr.status not in {"canceled", "cancelled"}:
+    if enr.status not in STATUS_CANCELED:
         enr.status = "canceled"
         db.add(enr); db.commit(); db.refresh(enr)
+        invalidate_event(enr.event_id)
 
     return {
         "id": enr.id,
@@ -214,3 +278,42 @@ def cancel_enrollment(
         "status": enr.status,
     }
 
+
+# ------------------------ endpoints: QR da inscrição ------------------------
+
+def _is_aluno(user) -> bool:
+    names = {str(getattr(r, "name", r)).lower() for r in (getattr(user, "roles", None) or [])}
+    return "aluno" in names and not names & {"admin", "organizer", "portaria"}
+
+@router.get("/enrollments/{enr_id}/qr",
+            dependencies=[Depends(require_roles("admin","organizer","portaria","aluno"))])
+def enrollment_qr(
+    enr_id: int,
+    format: str = Query("svg", pattern="^(svg|png)$"),
+    module: int = Query(4, ge=1, le=20, description="px por módulo"),
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    user = Depends(get_current_user_scoped),
+):
+    """
+    QR com o token rotativo da inscrição (o mesmo aceito em /gate/scan/qr).
+    Muda a cada QR_ROTATION_SECONDS; o cliente recarrega ao expirar.
+    """
+    row = db.execute(
+        select(Enrollment, Student.email)
+        .join(Event, Enrollment.event_id == Event.id)
+        .join(Student, Enrollment.student_id == Student.id)
+        .where(Enrollment.id == enr_id, Event.client_id == tenant.id)
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="enrollment_not_found")
+    enr, email = row
+    if _is_aluno(user) and (email or "").lower().strip() != (getattr(user, "email", "") or "").lower().strip():
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    token = build_qr_token(enr.qr_seed)
+    expires_in = (current_window() + 1) * settings.QR_ROTATION_SECONDS - int(time.time())
+    headers = {"Cache-Control": "no-store", "X-QR-Expires-In": str(max(0, expires_in))}
+    if format == "png":
+        return Response(qr_png(token, module=module), media_type="image/png", headers=headers)
+    return Response(qr_svg(token, module=module), media_type="image/svg+xml", headers=headers)
@@ -17,6 +17,7 @@ from fastapi import APIRouter, Depends, HTTPException, Body, status
 from datetime import date, time
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
 import sqlalchemy as sa
+from app.services.roster import invalidate_day, invalidate_event
 
 
 router = APIRouter()
@@ -158,6 +159,7 @@ def delete_event(
 
     res_evt = db.execute(sa.text("DELETE FROM events WHERE id = :e AND client_id = :c"), params)
     db.commit()
+    invalidate_event(event_id)
 
     return {"deleted": bool(res_evt.rowcount), "cascade": force}
 
@@ -226,6 +228,7 @@ def update_day(
     db.add(d)
     db.commit()
     db.refresh(d)
+    invalidate_day(d.id)
 
     return DayEvent(
         id=d.id,
@@ -260,4 +263,5 @@ def delete_day(
 
     db.delete(d)
     db.commit()
+    invalidate_day(day_id)
     return None
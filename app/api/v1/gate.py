@@ -2,37 +2,54 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Literal
+from typing import List, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import select
 from app.api.deps import get_db, get_tenant, get_current_user_scoped
+from app.core.config import settings
 from app.core.rbac import require_min_role, ROLE_PORTARIA
-from app.models.enrollment import Enrollment as EnrollmentModel
-from app.models.day_event import DayEvent as DayEventModel
-from app.models.attendance import Attendance as AttendanceModel
+from app.models.attendance import AttendanceOrigin
+from app.services.attendance import Scan, apply_scans, merge_scans, attendance_to_dict
+from app.services.roster import Roster, get_roster
+from app.services.qr import resolve_qr_token
+from app.services.gate_queue import write_behind
 
 router = APIRouter()
 
+GATE_BATCH_MAX_ITEMS = 1000
+
+# sincronização offline (NDJSON)
+OFFLINE_SYNC_CHUNK = 2000        # linhas por transação
+OFFLINE_SYNC_MAX_LINE = 4096     # bytes; protege o buffer de uma linha sem "\n"
+OFFLINE_SYNC_MAX_ERRORS = 100    # erros detalhados devolvidos no resumo
+
 from pydantic import BaseModel
 class GatePayload(BaseModel):
     enrollment_id: int
     day_event_id: int
     action: Literal["checkin", "checkout"]
 
-def _require_same_tenant(db: Session, tenant, enr_id: int, day_id: int) -> tuple[EnrollmentModel, DayEventModel]:
-    enr = db.get(EnrollmentModel, enr_id)
-    if not enr:
-        raise HTTPException(status_code=404, detail="Enrollment não encontrado")
-    day = db.get(DayEventModel, day_id)
-    if not day:
-        raise HTTPException(status_code=404, detail="Dia do evento não encontrado")
-    # valida escopo via evento do DayEvent
-    ev = db.get(type(day).event.property.mapper.class_, day.event_id)  # DayEvent->Event
-    if not ev or ev.client_id != tenant.id:
-        raise HTTPException(status_code=403, detail="Tenant mismatch")
-    return enr, day
+def _require_same_tenant(db: Session, tenant, enr_id: int, day_id: int) -> Roster:
+    # valida via roster em cache (dia -> evento -> tenant + inscrições ativas)
+    roster = get_roster(db, day_id)
+    err = _scope_error(tenant, roster, enr_id)
+    if err:
+        raise HTTPException(status_code=err[0], detail=err[1])
+    return roster
+
+def _scope_error(tenant, roster: Roster | None, enr_id: int) -> tuple[int, str] | None:
+    if roster is None:
+        return 404, "Dia do evento não encontrado"
+    if roster.client_id != tenant.id:
+        return 403, "Tenant mismatch"
+    if enr_id not in roster.enrollment_ids:
+        return 404, "Enrollment não encontrado"
+    return None
 
 @router.post("/scan", dependencies=[Depends(require_min_role(ROLE_PORTARIA))])
 def gate_scan(
@@ -41,31 +58,205 @@ def gate_scan(
     tenant = Depends(get_tenant),
     _ = Depends(get_current_user_scoped),
 ):
-    enr, day = _require_same_tenant(db, tenant, body.enrollment_id, body.day_event_id)
+    _require_same_tenant(db, tenant, body.enrollment_id, body.day_event_id)
+    return _scan_one(db, body.enrollment_id, body.day_event_id, body.action)
+
+def _scan_one(db: Session, enr_id: int, day_id: int, action: str):
+    now = dt.datetime.now(dt.timezone.utc)
+    scan = Scan(enr_id, day_id, action, now)
+
+    # modo write-behind: scan já validado pelo roster; ACK antes da gravação.
+    # Checkout sem checkin é descartado pelo flusher (métrica dropped).
+    if settings.GATE_WRITE_BEHIND and write_behind.submit(scan):
+        return JSONResponse(status_code=202, content={
+            "queued": True,
+            "enrollment_id": enr_id,
+            "day_event_id": day_id,
+            "action": action,
+            "at": now.isoformat(),
+        })
+
+    [att] = apply_scans(db, [scan])
+    if att is None:
+        raise HTTPException(status_code=404, detail="Registro de presença não encontrado para checkout")
+
+    out = attendance_to_dict(att)  # já tem id após o flush; evita o refresh pós-commit
+    db.commit()
+    return out
+
+# ------------------------ scan por QR rotativo ------------------------
+
+class QrScanPayload(BaseModel):
+    token: str
+    day_event_id: int
+    action: Literal["checkin", "checkout"]
+
+@router.post("/scan/qr", dependencies=[Depends(require_min_role(ROLE_PORTARIA))])
+def gate_scan_qr(
+    body: QrScanPayload = Body(...),
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _ = Depends(get_current_user_scoped),
+):
+    """
+    Scan pelo token rotativo do QR (build_qr_token), sem expor o enrollment_id.
+    O token é resolvido por índice em memória das janelas anterior/atual/próxima.
+    """
+    roster = get_roster(db, body.day_event_id)
+    if roster is None:
+        raise HTTPException(status_code=404, detail="Dia do evento não encontrado")
+    if roster.client_id != tenant.id:
+        raise HTTPException(status_code=403, detail="Tenant mismatch")
+    enr_id = resolve_qr_token(roster, body.token)
+    if enr_id is None:
+        raise HTTPException(status_code=404, detail="QR inválido ou expirado")
+    return _scan_one(db, enr_id, body.day_event_id, body.action)
+
+# ------------------------ scan em lote ------------------------
+
+def _rosters_for(db: Session, items) -> dict[int, Roster | None]:
+    # um roster por dia distinto do lote (em cache na maioria dos casos)
+    return {d: get_roster(db, d) for d in {i.day_event_id for i in items}}
 
-    att = db.execute(
-        select(AttendanceModel).where(
-            AttendanceModel.enrollment_id == enr.id,
-            AttendanceModel.day_event_id == day.id,
-        )
-    ).scalar_one_or_none()
+def _item_error(index: int, status_code: int, detail: str) -> dict:
+    return {"index": index, "ok": False, "status_code": status_code, "detail": detail}
 
+@router.post("/scan/batch", dependencies=[Depends(require_min_role(ROLE_PORTARIA))])
+def gate_scan_batch(
+    items: List[GatePayload] = Body(..., min_length=1, max_length=GATE_BATCH_MAX_ITEMS),
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _ = Depends(get_current_user_scoped),
+):
+    """
+    Vários scans numa requisição: escopo validado pelos rosters em cache,
+    upsert de todas as presenças numa única transação.
+    Retorna um resultado por item, na ordem recebida (erros não abortam o lote).
+    """
+    rosters = _rosters_for(db, items)
+
+    results: list[dict | None] = [None] * len(items)
+    valid: list[tuple[int, Scan]] = []
     now = dt.datetime.now(dt.timezone.utc)
-    if body.action == "checkin":
-        if not att:
-            att = AttendanceModel(enrollment_id=enr.id, day_event_id=day.id, checkin_at=now, origin="gate")
+    for idx, it in enumerate(items):
+        err = _scope_error(tenant, rosters[it.day_event_id], it.enrollment_id)
+        if err:
+            results[idx] = _item_error(idx, *err)
         else:
-            att.checkin_at = now
-    else:
-        if not att:
-            raise HTTPException(status_code=404, detail="Registro de presença não encontrado para checkout")
-        att.checkout_at = now
-
-    db.add(att); db.commit(); db.refresh(att)
-    return {
-        "id": att.id,
-        "enrollment_id": att.enrollment_id,
-        "day_event_id": att.day_event_id,
-        "checkin_at": att.checkin_at,
-        "checkout_at": att.checkout_at,
-    }
+            valid.append((idx, Scan(it.enrollment_id, it.day_event_id, it.action, now)))
+
+    if valid:
+        atts = apply_scans(db, [s for _, s in valid])
+        for (idx, _s), att in zip(valid, atts):
+            if att is None:
+                results[idx] = _item_error(idx, 404, "Registro de presença não encontrado para checkout")
+            else:
+                results[idx] = {"index": idx, "ok": True, "attendance": attendance_to_dict(att)}
+        db.commit()
+
+    return results
+
+# ------------------------ sincronização offline ------------------------
+
+class OfflineScan(GatePayload):
+    at: dt.datetime  # horário registrado no dispositivo (sem fuso = UTC)
+
+def _new_sync_summary() -> dict:
+    return {"received": 0, "accepted": 0, "rejected": 0,
+            "inserted": 0, "updated": 0, "unchanged": 0, "errors": []}
+
+def _sync_reject(summary: dict, line_no: int, detail: str) -> None:
+    summary["rejected"] += 1
+    if len(summary["errors"]) < OFFLINE_SYNC_MAX_ERRORS:
+        summary["errors"].append({"line": line_no, "detail": detail})
+
+def _merge_offline_chunk(db: Session, tenant, lines: list[tuple[int, bytes]], summary: dict) -> None:
+    """Parse + validação de escopo + merge de um bloco de linhas, numa transação."""
+    parsed: list[tuple[int, OfflineScan]] = []
+    for line_no, raw in lines:
+        try:
+            parsed.append((line_no, OfflineScan.model_validate_json(raw)))
+        except ValidationError as e:
+            _sync_reject(summary, line_no, e.errors(include_url=False)[0]["msg"])
+    if not parsed:
+        return
+
+    rosters = _rosters_for(db, [p for _, p in parsed])
+    scans: list[Scan] = []
+    line_of: dict[int, int] = {}
+    for line_no, p in parsed:
+        err = _scope_error(tenant, rosters[p.day_event_id], p.enrollment_id)
+        if err:
+            _sync_reject(summary, line_no, err[1])
+            continue
+        scan = Scan(p.enrollment_id, p.day_event_id, p.action, p.at)
+        line_of[id(scan)] = line_no
+        scans.append(scan)
+    if not scans:
+        return
+
+    # corrida com o scan online (INSERT concorrente na mesma chave): uma nova
+    # tentativa já encontra a linha e cai no caminho de merge
+    for attempt in (1, 2):
+        try:
+            res = merge_scans(db, scans, origin=AttendanceOrigin.offline_sync.value)
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt == 2:
+                raise
+
+    for scan, detail in res.rejected:
+        _sync_reject(summary, line_of[id(scan)], detail)
+    summary["accepted"] += len(scans) - len(res.rejected)
+    summary["inserted"] += res.inserted
+    summary["updated"] += res.updated
+    summary["unchanged"] += res.unchanged
+
+@router.post("/sync", dependencies=[Depends(require_min_role(ROLE_PORTARIA))])
+async def gate_offline_sync(
+    request: Request,
+    db: Session = Depends(get_db),
+    tenant = Depends(get_tenant),
+    _ = Depends(get_current_user_scoped),
+):
+    """
+    Upload de scans acumulados por um dispositivo sem conexão.
+    Corpo NDJSON (application/x-ndjson), uma linha por scan:
+      {"enrollment_id": 1, "day_event_id": 2, "action": "checkin", "at": "2025-03-10T08:01:12-03:00"}
+    Processado em blocos de OFFLINE_SYNC_CHUNK linhas (memória limitada, um
+    commit por bloco). O merge é idempotente: reenviar o arquivo é seguro.
+    """
+    summary = _new_sync_summary()
+    chunk: list[tuple[int, bytes]] = []
+    buf = b""
+    line_no = 0
+
+    async def _flush() -> None:
+        nonlocal chunk
+        if chunk:
+            await run_in_threadpool(_merge_offline_chunk, db, tenant, chunk, summary)
+            chunk = []
+
+    async for part in request.stream():
+        buf += part
+        *lines, buf = buf.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            if len(raw) > OFFLINE_SYNC_MAX_LINE:
+                raise HTTPException(status_code=413, detail=f"Linha {line_no} excede {OFFLINE_SYNC_MAX_LINE} bytes")
+            if raw.strip():
+                summary["received"] += 1
+                chunk.append((line_no, raw))
+        if len(buf) > OFFLINE_SYNC_MAX_LINE:
+            raise HTTPException(status_code=413, detail=f"Linha {line_no + 1} excede {OFFLINE_SYNC_MAX_LINE} bytes")
+        if len(chunk) >= OFFLINE_SYNC_CHUNK:
+            await _flush()
+
+    if buf.strip():
+        line_no += 1
+        summary["received"] += 1
+        chunk.append((line_no, buf))
+    await _flush()
+    return summary
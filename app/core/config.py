@@ -23,5 +23,36 @@ class Settings(BaseModel):
     CHECKIN_WINDOW_MIN_BEFORE: int = Field(default_factory=lambda: int(os.getenv("CHECKIN_WINDOW_MIN_BEFORE", "30")))
     CHECKIN_WINDOW_MIN_AFTER: int = Field(default_factory=lambda: int(os.getenv("CHECKIN_WINDOW_MIN_AFTER", "30")))
     TIMEZONE: str = Field(default_factory=lambda: os.getenv("TIMEZONE", "America/Sao_Paulo"))
+    # write-behind da portaria: ACK imediato, gravação em lote por thread
+    GATE_WRITE_BEHIND: bool = Field(default_factory=lambda: os.getenv("GATE_WRITE_BEHIND", "0").lower() in {"1", "true", "yes", "on"})
+    GATE_FLUSH_INTERVAL_MS: int = Field(default_factory=lambda: int(os.getenv("GATE_FLUSH_INTERVAL_MS", "50")))
+    GATE_FLUSH_MAX_ITEMS: int = Field(default_factory=lambda: int(os.getenv("GATE_FLUSH_MAX_ITEMS", "500")))
+    GATE_QUEUE_MAXSIZE: int = Field(default_factory=lambda: int(os.getenv("GATE_QUEUE_MAXSIZE", "20000")))
+    # falhas seguidas do mesmo lote antes de dividi-lo para isolar o scan problemático
+    GATE_FLUSH_MAX_RETRIES: int = Field(default_factory=lambda: int(os.getenv("GATE_FLUSH_MAX_RETRIES", "3")))
+    ROSTER_CACHE_TTL_SECONDS: int = Field(default_factory=lambda: int(os.getenv("ROSTER_CACHE_TTL_SECONDS", "60")))
+    # tenant resolvido pelo slug em get_tenant; alterações via /clients invalidam na hora
+    TENANT_CACHE_TTL_SECONDS: int = Field(default_factory=lambda: int(os.getenv("TENANT_CACHE_TTL_SECONDS", "60")))
+    # emissão em lote: processos para renderizar PDFs (0 = na própria thread do job)
+    CERT_RENDER_WORKERS: int = Field(default_factory=lambda: int(os.getenv("CERT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1)))))
+    CERT_JOB_CHUNK: int = Field(default_factory=lambda: int(os.getenv("CERT_JOB_CHUNK", "50")))
+    # sinal de vida dos jobs em execução; sem sinal há 3 intervalos o job é dado como órfão
+    CERT_JOB_HEARTBEAT_SECONDS: int = Field(default_factory=lambda: int(os.getenv("CERT_JOB_HEARTBEAT_SECONDS", "30")))
+    # emissão só grava a linha e o código; o PDF é gerado no primeiro download
+    CERT_LAZY_PDF: bool = Field(default_factory=lambda: os.getenv("CERT_LAZY_PDF", "0").lower() in {"1", "true", "yes", "on"})
+    # armazenamento dos PDFs: "local" (DATA_DIR/public/certificates) ou "s3" (S3/MinIO)
+    CERT_STORAGE_BACKEND: str = Field(default_factory=lambda: os.getenv("CERT_STORAGE_BACKEND", "local").lower())
+    CERT_S3_BUCKET: str = Field(default_factory=lambda: os.getenv("CERT_S3_BUCKET", ""))
+    CERT_S3_PREFIX: str = Field(default_factory=lambda: os.getenv("CERT_S3_PREFIX", "certificates"))
+    CERT_S3_ENDPOINT_URL: str = Field(default_factory=lambda: os.getenv("CERT_S3_ENDPOINT_URL", ""))
+    CERT_S3_REGION: str = Field(default_factory=lambda: os.getenv("CERT_S3_REGION", ""))
+    # cache da verificação pública (/verify/{code}); emissão/revogação invalidam no commit
+    VERIFY_CACHE_TTL_SECONDS: int = Field(default_factory=lambda: int(os.getenv("VERIFY_CACHE_TTL_SECONDS", "120")))
+    VERIFY_NOT_FOUND_TTL_SECONDS: int = Field(default_factory=lambda: int(os.getenv("VERIFY_NOT_FOUND_TTL_SECONDS", "10")))
+    # chave dos códigos de verificação (permutação + MAC); vazio = SECRET_KEY.
+    # Fixe-a antes de rotacionar SECRET_KEY, senão os códigos emitidos deixam de validar
+    VERIFY_CODE_SECRET: str = Field(default_factory=lambda: os.getenv("VERIFY_CODE_SECRET", ""))
+    # códigos de 10 chars sem MAC (emitidos antes dele) ainda consultam o banco
+    VERIFY_LEGACY_CODES: bool = Field(default_factory=lambda: os.getenv("VERIFY_LEGACY_CODES", "1").lower() in {"1", "true", "yes", "on"})
 
 settings = Settings()
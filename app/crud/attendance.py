@@ -6,6 +6,8 @@ from app.models.attendance import Attendance
 from app.models.enrollment import Enrollment, EnrollmentStatus
 from app.models.day_event import DayEvent
 from app.core.config import settings
+from app.services import occupancy  # noqa: F401 — listeners: contadores do dia no mesmo commit
+from app.services import eligibility  # noqa: F401 — listeners: enrollment_presence no mesmo commit
 from zoneinfo import ZoneInfo
 
 class CRUDAttendance(CRUDBase[Attendance, None, None]):
@@ -4,6 +4,7 @@ from app.crud.base import CRUDBase
 from app.models.enrollment import Enrollment, EnrollmentStatus
 from app.schemas.enrollment import Enrollment as EnrSchema
 from app.models.event import Event
+from app.services.roster import invalidate_event
 
 class CRUDEnrollment(CRUDBase[Enrollment, EnrSchema, EnrSchema]):
     def enroll(self, db: Session, *, student_id: int, event_id: int, qr_seed: str) -> Enrollment:
@@ -14,6 +15,7 @@ class CRUDEnrollment(CRUDBase[Enrollment, EnrSchema, EnrSchema]):
             status = EnrollmentStatus.waitlist
         enr = Enrollment(student_id=student_id, event_id=event_id, status=status, qr_seed=qr_seed)
         db.add(enr); db.commit(); db.refresh(enr)
+        invalidate_event(event_id)
         return enr
 
 enrollment_crud = CRUDEnrollment(Enrollment)
@@ -21,8 +21,12 @@ from app.models.role import Role
 from app.models.student import Student
 from app.models.event import Event
 from app.models.day_event import DayEvent
+from app.models.day_event_counter import DayEventCounter
 from app.models.enrollment import Enrollment
+from app.models.enrollment_presence import EnrollmentPresence
 from app.models.attendance import Attendance
 from app.models.certificate import Certificate
+from app.models.certificate_job import CertificateJob
+from app.models.id_sequence import IdSequence
 from app.models.audit import AuditLog
 from app.models.tokens import RefreshToken
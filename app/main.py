@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 from app.api.v1.router import api_router
+from app.api.v1 import certificates
 from app.core.logging import setup_logging
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import IntegrityError
@@ -16,6 +17,8 @@ from app.models.user_role import user_roles  # <-- precisa estar importado
 from app.models.user import User
 from app.models.role import Role
 from app.models.client import Client
+from app.services.gate_queue import write_behind
+from app.services import certificate_jobs, verify_codes
 
 app = FastAPI(title="Eventos API")
 
@@ -51,12 +54,16 @@ api.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # cabeçalhos próprios que o frontend precisa ler (paginação, QR, Range/ETag)
+    expose_headers=["X-Next-Cursor", "X-QR-Expires-In", "ETag", "Content-Range"],
 )
 
 # métricas /metrics (Prometheus)
 Instrumentator().instrument(api).expose(api, include_in_schema=False, should_gzip=True)
 
 api.include_router(api_router, prefix="/api/v1")
+# verificação pública: é para cá que aponta o QR dos certificados (_verify_base)
+api.include_router(certificates.verify_router, prefix="/verify", tags=["verify"])
 
 @api.get("/healthz", tags=["health"])
 def healthz():
@@ -65,6 +72,18 @@ def healthz():
 @api.on_event("startup")
 def startup():
     run_migrations_and_seed()
+    certificate_jobs.recover_orphaned_jobs()
+    if settings.VERIFY_LEGACY_CODES:
+        verify_codes.load_legacy_codes()
+    if settings.GATE_WRITE_BEHIND:
+        write_behind.start()
+
+@api.on_event("shutdown")
+def shutdown():
+    # drena a fila de scans antes de o worker sair
+    write_behind.stop()
+    certificate_jobs.shutdown()
+
 @api.exception_handler(IntegrityError)
 def handle_integrity_error(request: Request, exc: IntegrityError):
     return JSONResponse(
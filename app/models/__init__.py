@@ -7,13 +7,17 @@ from app.models.user_role import user_roles
 from app.models.student import Student
 from app.models.event import Event
 from app.models.day_event import DayEvent
+from app.models.day_event_counter import DayEventCounter
 from app.models.enrollment import Enrollment, EnrollmentStatus
+from app.models.enrollment_presence import EnrollmentPresence
 from app.models.attendance import Attendance, AttendanceOrigin
 from app.models.certificate import Certificate, CertificateStatus
+from app.models.certificate_job import CertificateJob, CertificateJobStatus
+from app.models.id_sequence import IdSequence
 from app.models.audit import AuditLog
 from app.models.tokens import RefreshToken, IdempotencyKey
 
 __all__ = [
-    "Base","Client","Role","User","user_roles","Student","Event","DayEvent","Enrollment","EnrollmentStatus",
-    "Attendance","AttendanceOrigin","Certificate","CertificateStatus","AuditLog","RefreshToken","IdempotencyKey"
+    "Base","Client","Role","User","user_roles","Student","Event","DayEvent","DayEventCounter","Enrollment","EnrollmentStatus","EnrollmentPresence",
+    "Attendance","AttendanceOrigin","Certificate","CertificateStatus","CertificateJob","CertificateJobStatus","IdSequence","AuditLog","RefreshToken","IdempotencyKey"
 ]
@@ -1,8 +1,8 @@
 from enum import Enum
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, String, DateTime
+from sqlalchemy import ForeignKey, String, DateTime, JSON
 from app.db.base import Base
 
 class CertificateStatus(str, Enum):
@@ -17,3 +17,6 @@ class Certificate(Base):
     pdf_url: Mapped[str] = mapped_column(String(255))
     verify_code: Mapped[str] = mapped_column(String(64), unique=True, index=True)
     status: Mapped[CertificateStatus] = mapped_column(default=CertificateStatus.issued)
+    # modo PDF sob demanda: o que a emissão decidiu (modo, presença, % mínimo, URL de
+    # verificação) para renderizar no primeiro download; None = PDF gerado na emissão
+    render_json: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
@@ -0,0 +1,38 @@
+from enum import Enum
+from datetime import datetime
+from typing import Any, List, Optional
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, String, Integer, Boolean, Text, JSON, DateTime, func
+from app.db.base import Base
+
+class CertificateJobStatus(str, Enum):
+    queued="queued"
+    running="running"
+    done="done"
+    failed="failed"
+
+class CertificateJob(Base):
+    """Emissão em lote assíncrona; persistida para o status valer em qualquer worker."""
+    __tablename__ = "certificate_jobs"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    client_id: Mapped[int] = mapped_column(ForeignKey("clients.id"), index=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), index=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), nullable=True)
+    mode: Mapped[str] = mapped_column(String(10), default="day")
+    reissue: Mapped[bool] = mapped_column(Boolean, default=False)
+    status: Mapped[CertificateJobStatus] = mapped_column(default=CertificateJobStatus.queued)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    issued: Mapped[int] = mapped_column(Integer, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    # um item por inscrição: {enrollment_id, status, certificate_id?, verify_code?, detail?}
+    results_json: Mapped[Optional[List[Any]]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # processo que executa o job e seu último sinal de vida: job queued/running com
+    # heartbeat velho é de um processo que morreu (ver recover_orphaned_jobs)
+    runner_id: Mapped[Optional[str]] = mapped_column(String(80), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
@@ -0,0 +1,13 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, Integer, DateTime, func
+from app.db.base import Base
+
+class DayEventCounter(Base):
+    """Contadores de presença por dia, mantidos no mesmo commit dos scans."""
+    __tablename__ = "day_event_counters"
+    day_event_id: Mapped[int] = mapped_column(ForeignKey("day_events.id", ondelete="CASCADE"), primary_key=True)
+    checked_in: Mapped[int] = mapped_column(Integer, default=0)
+    checked_out: Mapped[int] = mapped_column(Integer, default=0)
+    inside: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -13,6 +13,9 @@ class EnrollmentStatus(str, Enum):
     waitlist="waitlist"
     cancelled="cancelled"
 
+# o enum usa "cancelled", cancel_enrollment grava "canceled": valem os dois
+STATUS_CANCELED = frozenset({"canceled", "cancelled"})
+
 class Enrollment(Base):
     __tablename__ = "enrollments"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
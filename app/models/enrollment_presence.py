@@ -0,0 +1,30 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, Integer, Float, Boolean, DateTime, Index, func
+from app.db.base import Base
+
+class EnrollmentPresence(Base):
+    """
+    Presença/elegibilidade por inscrição, mantida no mesmo commit das presenças.
+    stale=True quando mudam dias ou % mínimo do evento: recalculada na próxima leitura.
+    """
+    __tablename__ = "enrollment_presence"
+    enrollment_id: Mapped[int] = mapped_column(ForeignKey("enrollments.id", ondelete="CASCADE"), primary_key=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
+    total_days: Mapped[int] = mapped_column(Integer, default=0)
+    present_days: Mapped[int] = mapped_column(Integer, default=0)
+    minutes_total: Mapped[int] = mapped_column(Integer, default=0)
+    minutes: Mapped[int] = mapped_column(Integer, default=0)
+    required_pct: Mapped[int] = mapped_column(Integer, default=0)
+    day_pct: Mapped[float] = mapped_column(Float, default=0.0)
+    hours_pct: Mapped[float] = mapped_column(Float, default=0.0)
+    eligible_day: Mapped[bool] = mapped_column(Boolean, default=False)
+    eligible_hours: Mapped[bool] = mapped_column(Boolean, default=False)
+    stale: Mapped[bool] = mapped_column(Boolean, default=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # "quem está elegível no evento" por leitura de índice
+        Index("ix_enrollment_presence_event_day", "event_id", "eligible_day"),
+        Index("ix_enrollment_presence_event_hours", "event_id", "eligible_hours"),
+    )
@@ -0,0 +1,9 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, BigInteger
+from app.db.base import Base
+
+class IdSequence(Base):
+    """Contador nomeado portável (SQLite/Postgres); reservado em blocos com UPDATE ... RETURNING."""
+    __tablename__ = "id_sequences"
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    next_value: Mapped[int] = mapped_column(BigInteger, default=1)
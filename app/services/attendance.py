@@ -0,0 +1,167 @@
+# app/services/attendance.py
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.attendance import Attendance, AttendanceOrigin
+
+Key = Tuple[int, int]  # (enrollment_id, day_event_id) — mesma chave do uq_attendance_unique
+
+@dataclass(frozen=True)
+class Scan:
+    enrollment_id: int
+    day_event_id: int
+    action: str          # "checkin" | "checkout"
+    at: dt.datetime
+
+    @property
+    def key(self) -> Key:
+        return (self.enrollment_id, self.day_event_id)
+
+def attendance_to_dict(att: Attendance) -> dict:
+    return {
+        "id": att.id,
+        "enrollment_id": att.enrollment_id,
+        "day_event_id": att.day_event_id,
+        "checkin_at": att.checkin_at,
+        "checkout_at": att.checkout_at,
+    }
+
+def as_utc(ts: Optional[dt.datetime]) -> Optional[dt.datetime]:
+    # SQLite devolve datetime "naive"; tratamos como UTC para poder comparar
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=dt.timezone.utc)
+    return ts
+
+def load_attendances(db: Session, keys: Set[Key]) -> Dict[Key, Attendance]:
+    """Um único SELECT para todas as chaves (enrollment_id, day_event_id)."""
+    if not keys:
+        return {}
+    enr_ids = {k[0] for k in keys}
+    day_ids = {k[1] for k in keys}
+    rows = db.execute(
+        select(Attendance).where(
+            Attendance.enrollment_id.in_(enr_ids),
+            Attendance.day_event_id.in_(day_ids),
+        )
+    ).scalars().all()
+    # o IN duplo pode trazer pares que não pedimos; filtra pela chave exata
+    return {
+        (a.enrollment_id, a.day_event_id): a
+        for a in rows
+        if (a.enrollment_id, a.day_event_id) in keys
+    }
+
+def apply_scans(
+    db: Session,
+    scans: Sequence[Scan],
+    *,
+    origin: str = AttendanceOrigin.gate.value,
+) -> List[Optional[Attendance]]:
+    """
+    Aplica checkins/checkouts da portaria em lote: um SELECT dos registros
+    existentes e todos os INSERT/UPDATE num único flush. NÃO faz commit.
+
+    Mesma regra do scan unitário: checkin cria ou sobrescreve checkin_at;
+    checkout exige registro existente. Retorna, na ordem de `scans`, o
+    Attendance afetado (None = checkout sem registro de presença).
+    """
+    existing = load_attendances(db, {s.key for s in scans})
+
+    out: List[Optional[Attendance]] = []
+    for s in scans:
+        att = existing.get(s.key)
+        if s.action == "checkin":
+            if att is None:
+                att = Attendance(
+                    enrollment_id=s.enrollment_id,
+                    day_event_id=s.day_event_id,
+                    checkin_at=s.at,
+                    origin=origin,
+                )
+                db.add(att)
+                existing[s.key] = att
+            else:
+                att.checkin_at = s.at
+        else:
+            if att is None:
+                out.append(None)
+                continue
+            att.checkout_at = s.at
+        out.append(att)
+
+    db.flush()
+    return out
+
+@dataclass
+class MergeResult:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: List[Tuple[Scan, str]] = field(default_factory=list)  # um item por scan recusado
+
+def merge_scans(
+    db: Session,
+    scans: Sequence[Scan],
+    *,
+    origin: str = AttendanceOrigin.offline_sync.value,
+) -> MergeResult:
+    """
+    Mescla scans com horário do dispositivo (sincronização offline).
+    Por chave do uq_attendance_unique: checkin mais cedo vence, checkout mais
+    tarde vence; scans repetidos colapsam numa única linha. Idempotente —
+    reenviar o mesmo lote não altera nada. NÃO faz commit.
+    """
+    merged: Dict[Key, List[Optional[dt.datetime]]] = {}
+    of_key: Dict[Key, List[Scan]] = {}
+    for s in scans:
+        at = as_utc(s.at)
+        cur = merged.setdefault(s.key, [None, None])
+        of_key.setdefault(s.key, []).append(s)
+        if s.action == "checkin":
+            if cur[0] is None or at < cur[0]:
+                cur[0] = at
+        else:
+            if cur[1] is None or at > cur[1]:
+                cur[1] = at
+
+    res = MergeResult()
+    existing = load_attendances(db, set(merged))
+    for key, (cin, cout) in merged.items():
+        att = existing.get(key)
+        if att is None:
+            if cin is None:
+                # todos os checkouts da chave são recusados, não só o primeiro
+                res.rejected.extend(
+                    (s, "Registro de presença não encontrado para checkout") for s in of_key[key]
+                )
+                continue
+            db.add(Attendance(
+                enrollment_id=key[0], day_event_id=key[1],
+                checkin_at=cin, checkout_at=cout, origin=origin,
+            ))
+            res.inserted += 1
+            continue
+
+        changed = False
+        if cin is not None and (att.checkin_at is None or cin < as_utc(att.checkin_at)):
+            att.checkin_at = cin
+            changed = True
+        if cout is not None and (att.checkout_at is None or cout > as_utc(att.checkout_at)):
+            att.checkout_at = cout
+            changed = True
+        if changed:
+            res.updated += 1
+        else:
+            res.unchanged += 1
+
+    db.flush()
+    return res
+
+# registra os listeners de flush/commit que alimentam ocupação ao vivo
+from app.services import occupancy as _occupancy  # noqa: E402,F401
@@ -0,0 +1,259 @@
+# app/services/cert_overlay.py
+#
+# Renderizador "fundo + campos": a página de fundo (tudo que é igual para a
+# turma inteira) vira PDF uma vez por cliente/evento; por aluno só se desenha
+# com reportlab o que varia (nome, horas, código, QR) e se carimba sobre o fundo.
+# Ativado por client.config_json["certificate_overlay"]:
+#
+#   {
+#     "background_html": "<html>…Jinja com client/evento/carga_horas…</html>",
+#     "fields": {
+#       "nome":   {"x": 421, "y": 300, "size": 26, "font": "Helvetica-Bold", "align": "center"},
+#       "horas":  {"x": 421, "y": 260, "text": "Carga horária: {carga_horas} horas"},
+#       "codigo": {"x": 60,  "y": 30,  "size": 9, "text": "Código {codigo} — {verify_url}"},
+#       "qr":     {"x": 700, "y": 30,  "size": 100}
+#     }
+#   }
+#
+# Coordenadas em pontos a partir do canto inferior esquerdo da página de fundo.
+# Em "text" valem: nome, cpf_mask, titulo, carga_horas, pct, required_pct,
+# codigo, emissao, verify_url. Sem "text", o campo desenha o valor de mesmo nome.
+# No "qr", size é o lado do símbolo; o fundo branco da zona de silêncio avança
+# 4 módulos além dele em cada lado.
+# Spec com erro (chave desconhecida, x/y ausente, fonte/cor/placeholder
+# inválidos) é ignorada com um aviso no log: vale o template HTML completo.
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import string
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    from pypdf import PdfReader, PdfWriter  # type: ignore
+    from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject  # type: ignore
+    from reportlab.lib import colors  # type: ignore
+    from reportlab.pdfbase import pdfmetrics  # type: ignore
+    from reportlab.pdfgen import canvas  # type: ignore
+    _HAS_OVERLAY = True
+except Exception:
+    _HAS_OVERLAY = False
+
+from app.core.cache import TTLCache
+from app.services.qr import QR_QUIET_ZONE, qr_matrix
+
+log = logging.getLogger(__name__)
+
+CONFIG_KEY = "certificate_overlay"
+QR_FIELD = "qr"
+FIELD_KEYS = frozenset({"x", "y", "size", "font", "align", "color", "text"})
+ALIGNS = ("left", "center", "right")
+
+# valores de exemplo, com os tipos de build_certificate_overlay: validam os
+# placeholders de "text" (inclusive o formato, ex. {pct:.1f}) antes do 1º PDF
+_SAMPLE_VALUES: Dict[str, Any] = dict(
+    nome="", cpf_mask="", titulo="", carga_horas=0, pct=0.0, required_pct=0,
+    codigo="", emissao="", verify_url="",
+)
+VALUES = frozenset(_SAMPLE_VALUES)
+
+class _FieldFormatter(string.Formatter):
+    """str.format restrito: só nomes simples ({nome}), sem {nome.attr}, {nome[0]} ou {0}."""
+
+    def get_field(self, field_name, args, kwargs):
+        if not field_name.isidentifier():
+            raise ValueError(f"placeholder inválido: {{{field_name}}}")
+        return kwargs[field_name], field_name
+
+class _Values(dict):
+    # mapeamento de format_map: só os valores do certificado; nome fora de VALUES é erro
+    def __missing__(self, key):
+        raise KeyError(key)
+
+_formatter = _FieldFormatter()
+
+def format_text(text: str, values: Dict[str, Any]) -> str:
+    return _formatter.vformat(text, (), _Values((k, values[k]) for k in VALUES if k in values))
+
+@dataclass
+class OverlayRender:
+    """Tudo que o processo de renderização precisa (picklable, vai para o pool)."""
+    background: bytes
+    fields: Dict[str, Dict[str, Any]]
+    values: Dict[str, Any]
+
+# overlay_spec roda por certificado: o mesmo aviso sai uma vez por hora, não por PDF
+_warned: TTLCache[str, bool] = TTLCache(3600, maxsize=256)
+
+def _warn(msg: str) -> None:
+    if _warned.get(msg) is None:
+        _warned.set(msg, True)
+        log.warning(msg)
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def _field_error(name: str, spec: Any) -> Optional[str]:
+    """Motivo pelo qual o campo quebraria o render_overlay_pdf, ou None."""
+    if not isinstance(spec, dict):
+        return "não é um objeto"
+    unknown = set(spec) - FIELD_KEYS
+    if unknown:
+        return f"chaves desconhecidas: {', '.join(sorted(unknown))}"
+    if not _is_number(spec.get("x")) or not _is_number(spec.get("y")):
+        return "x e y são obrigatórios e numéricos"
+    if "size" in spec and (not _is_number(spec["size"]) or spec["size"] <= 0):
+        return "size deve ser um número positivo"
+    if spec.get("align", "left") not in ALIGNS:
+        return f"align deve ser {', '.join(ALIGNS)}"
+    font = spec.get("font")
+    if font is not None and font not in pdfmetrics.standardFonts and font not in pdfmetrics.getRegisteredFontNames():
+        return f"fonte desconhecida: {font}"
+    if "color" in spec:
+        try:
+            colors.toColor(spec["color"])
+        except Exception:
+            return f"cor inválida: {spec['color']}"
+    text = spec.get("text")
+    if text is not None:
+        if not isinstance(text, str):
+            return "text deve ser uma string"
+        try:
+            format_text(text, _SAMPLE_VALUES)
+        except KeyError as e:
+            return f"placeholder desconhecido em text: {{{e.args[0]}}}"
+        except (ValueError, TypeError, IndexError) as e:
+            return f"text inválido: {e}"
+    elif name != QR_FIELD and name not in VALUES:
+        return "sem text, o nome do campo deve ser um dos valores do certificado"
+    return None
+
+def overlay_spec(config: Optional[dict]) -> Optional[dict]:
+    """Spec válida do cliente, ou None (usa o template HTML completo)."""
+    spec = (config or {}).get(CONFIG_KEY)
+    if not isinstance(spec, dict):
+        return None
+    if not _HAS_OVERLAY:
+        _warn(f"{CONFIG_KEY} configurado, mas pypdf/reportlab não estão instalados; usando o template HTML")
+        return None
+    if not spec.get("background_html") or not isinstance(spec.get("fields"), dict):
+        return None
+    for name, field_spec in spec["fields"].items():
+        err = _field_error(name, field_spec)
+        if err:
+            _warn(f"{CONFIG_KEY}: campo {name!r} inválido ({err}); usando o template HTML")
+            return None
+    return spec
+
+BACKGROUND_NAME = "/CertBg"
+
+@dataclass
+class _Background:
+    width: float
+    height: float
+    form: Any  # Form XObject com o conteúdo e os recursos da página de fundo
+
+def _to_form(page) -> Any:
+    # a página inteira vira um Form XObject: o conteúdo dela não é reinterpretado
+    # a cada aluno (merge_page faz isso) e seus recursos não colidem com os do overlay
+    contents = page.get("/Contents")
+    streams = contents.get_object() if contents is not None else []
+    if not isinstance(streams, ArrayObject):
+        streams = [streams]
+    form = DecodedStreamObject()
+    form.set_data(b"\n".join(s.get_object().get_data() for s in streams))
+    form.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): page.mediabox,
+        NameObject("/Resources"): page.get("/Resources", DictionaryObject()).get_object(),
+    })
+    return form.flate_encode()
+
+# fundo já convertido, por processo (o pool reaproveita entre tarefas)
+_backgrounds: TTLCache[str, _Background] = TTLCache(3600, maxsize=32)
+
+def _background(background: bytes) -> _Background:
+    key = hashlib.sha256(background).hexdigest()
+    bg = _backgrounds.get(key)
+    if bg is None:
+        page = PdfReader(io.BytesIO(background)).pages[0]
+        bg = _Background(float(page.mediabox.width), float(page.mediabox.height), _to_form(page))
+        # replace_contents registra o form como objeto indireto de um writer
+        # auxiliar; com isso form.clone(writer) o copia como objeto próprio de
+        # cada PDF (a pypdf não tem API pública para criar objetos indiretos)
+        PdfWriter().add_blank_page(bg.width, bg.height).replace_contents(bg.form)
+        _backgrounds.set(key, bg)
+    return bg
+
+def _draw_text(c, spec: Dict[str, Any], text: str) -> None:
+    c.setFont(spec.get("font", "Helvetica"), float(spec.get("size", 12)))
+    if spec.get("color"):
+        c.setFillColor(spec["color"])
+    x, y = float(spec["x"]), float(spec["y"])
+    align = spec.get("align", "left")
+    if align == "center":
+        c.drawCentredString(x, y, text)
+    elif align == "right":
+        c.drawRightString(x, y, text)
+    else:
+        c.drawString(x, y, text)
+
+def _draw_qr(c, spec: Dict[str, Any], text: str) -> None:
+    # vetorial: um retângulo por sequência escura de cada linha, sem imagem a codificar.
+    # Em unidades de módulo (inteiros) e escritos direto no stream: formatar
+    # centenas de floats com path.rect custa mais que o resto da página.
+    matrix = qr_matrix(text)
+    n = len(matrix)
+    size = float(spec.get("size", 100))
+    ops = []
+    for row_i, row in enumerate(matrix):
+        x = 0
+        while x < n:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < n and row[x]:
+                x += 1
+            ops.append(f"{start} {row_i} {x - start} 1 re")
+    q = QR_QUIET_ZONE
+    c.saveState()
+    c.translate(float(spec["x"]), float(spec["y"]) + size)
+    c.scale(size / n, -size / n)  # linha 0 do QR no topo
+    # fundo claro com a zona de silêncio (4 módulos além do símbolo em cada lado):
+    # sem ele os módulos ficam direto sobre a arte do fundo e a leitura falha
+    c.setFillColor("white")
+    c.addLiteral(f"{-q} {-q} {n + 2 * q} {n + 2 * q} re f")
+    c.setFillColor(spec.get("color", "black"))
+    c.addLiteral(" ".join(ops) + " f")
+    c.restoreState()
+
+def render_overlay_pdf(job: OverlayRender) -> bytes:
+    bg = _background(job.background)
+
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=(bg.width, bg.height), pageCompression=1)
+    for name, spec in job.fields.items():
+        if name == QR_FIELD:
+            _draw_qr(c, spec, str(job.values.get("verify_url", "")))
+            continue
+        text = spec.get("text")
+        _draw_text(c, spec, format_text(text, job.values) if text else str(job.values.get(name, "")))
+    c.showPage()
+    c.save()
+
+    # página = campos do aluno + "desenhe o fundo" por baixo (q /CertBg Do Q)
+    writer = PdfWriter()
+    page = writer.add_page(PdfReader(buf).pages[0])
+    resources = page[NameObject("/Resources")].get_object()
+    xobjects = resources.setdefault(NameObject("/XObject"), DictionaryObject()).get_object()
+    xobjects[NameObject(BACKGROUND_NAME)] = bg.form.clone(writer).indirect_reference
+    contents = DecodedStreamObject()
+    contents.set_data(b"q " + BACKGROUND_NAME.encode() + b" Do Q\n" + page.get_contents().get_data())
+    page.replace_contents(contents.flate_encode())
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
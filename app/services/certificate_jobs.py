@@ -0,0 +1,308 @@
+# app/services/certificate_jobs.py
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.certificate_job import CertificateJob, CertificateJobStatus
+from app.models.client import Client
+from app.models.enrollment import Enrollment
+from app.models.event import Event
+from app.services.certificates import (
+    PendingCertificate,
+    finalize_certificate,
+    prepare_certificate,
+    render_pending_pdf,
+)
+from app.services.eligibility import presence_eligibility
+from app.services.verify_codes import new_verify_codes
+
+log = logging.getLogger(__name__)
+
+# um job por vez em cada processo; o paralelismo está na renderização dos PDFs
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cert-jobs")
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# jobs deste processo (queued/running), para o heartbeat e o shutdown
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_futures: Dict[int, Future] = {}
+_futures_lock = threading.Lock()
+_stopping = threading.Event()
+_heartbeat: Optional[threading.Thread] = None
+
+_UNFINISHED = (CertificateJobStatus.queued, CertificateJobStatus.running)
+
+class JobInterrupted(RuntimeError):
+    pass
+
+def _render_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if settings.CERT_RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o worker do servidor tem threads, e fork herdaria locks em estado arbitrário
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.CERT_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def _discard_pool() -> None:
+    # processo filho morreu (OOM, segfault no renderizador): o próximo job cria outro pool
+    global _pool
+    with _pool_lock:
+        broken, _pool = _pool, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+def create_job(
+    db: Session,
+    *,
+    tenant: Client,
+    event: Event,
+    mode: str = "day",
+    reissue: bool = False,
+    user_id: Optional[int] = None,
+) -> CertificateJob:
+    job = CertificateJob(
+        client_id=tenant.id, event_id=event.id, user_id=user_id,
+        mode=mode, reissue=reissue, status=CertificateJobStatus.queued,
+        total=0, processed=0, issued=0, skipped=0, failed=0,
+        runner_id=RUNNER_ID, heartbeat_at=_now(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def submit_job(job_id: int, verify_url_base: str) -> None:
+    """Agenda o job neste processo; o progresso fica em certificate_jobs."""
+    fut = _runner.submit(run_job, job_id, verify_url_base)
+    with _futures_lock:
+        _futures[job_id] = fut
+    fut.add_done_callback(lambda _f: _forget(job_id))
+    _ensure_heartbeat()
+
+def _forget(job_id: int) -> None:
+    with _futures_lock:
+        _futures.pop(job_id, None)
+
+# ------------------------ sinal de vida / jobs órfãos ------------------------
+
+def _ensure_heartbeat() -> None:
+    global _heartbeat
+    with _futures_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="cert-jobs-heartbeat", daemon=True)
+            _heartbeat.start()
+
+def _heartbeat_loop() -> None:
+    # uma UPDATE por intervalo, só enquanto houver job deste processo na fila
+    while not _stopping.wait(max(1, settings.CERT_JOB_HEARTBEAT_SECONDS)):
+        with _futures_lock:
+            ids = list(_futures)
+        if not ids:
+            continue
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    update(CertificateJob)
+                    .where(CertificateJob.id.in_(ids), CertificateJob.status.in_(_UNFINISHED))
+                    .values(heartbeat_at=_now())
+                )
+                db.commit()
+        except Exception:
+            log.exception("heartbeat dos jobs de certificados falhou")
+
+def _fail_jobs(db: Session, where, error: str) -> int:
+    res = db.execute(
+        update(CertificateJob)
+        .where(CertificateJob.status.in_(_UNFINISHED), where)
+        .values(status=CertificateJobStatus.failed, error=error, finished_at=_now())
+    )
+    db.commit()
+    return res.rowcount or 0
+
+def recover_orphaned_jobs() -> int:
+    """
+    Na subida do processo: job queued/running sem sinal de vida há 3 intervalos
+    de heartbeat é de um processo que morreu (deploy, OOM) e nunca vai terminar.
+    Vira failed para quem acompanha GET /jobs/{id}; basta criar outro job.
+    Jobs vivos de outros workers seguem com heartbeat recente e não são tocados.
+    """
+    cutoff = _now() - dt.timedelta(seconds=3 * max(1, settings.CERT_JOB_HEARTBEAT_SECONDS))
+    with SessionLocal() as db:
+        n = _fail_jobs(
+            db,
+            or_(CertificateJob.heartbeat_at.is_(None), CertificateJob.heartbeat_at < cutoff),
+            "interrompido: o processo que executava o job parou",
+        )
+    if n:
+        log.warning("%s job(s) de certificados órfão(s) marcados como failed", n)
+    return n
+
+def run_job(job_id: int, verify_url_base: str) -> None:
+    with SessionLocal() as db:
+        job = db.get(CertificateJob, job_id)
+        if job is None or job.status != CertificateJobStatus.queued:
+            return
+        try:
+            _execute(db, job, verify_url_base)
+        except Exception as e:
+            db.rollback()
+            if isinstance(e, JobInterrupted):
+                log.warning("job de certificados %s: %s", job_id, e)
+            else:
+                log.exception("job de certificados %s falhou", job_id)
+            if isinstance(e, BrokenProcessPool):
+                _discard_pool()
+            job = db.get(CertificateJob, job_id)
+            job.status = CertificateJobStatus.failed
+            job.error = str(e)[:2000]
+            job.finished_at = _now()
+            db.commit()
+
+def _execute(db: Session, job: CertificateJob, verify_url_base: str) -> None:
+    tenant = db.get(Client, job.client_id)
+    event = db.get(Event, job.event_id)
+    enrollments = db.execute(
+        select(Enrollment).where(Enrollment.event_id == job.event_id)
+        .options(joinedload(Enrollment.student))
+        .order_by(Enrollment.id)
+    ).scalars().all()
+    # elegibilidade persistida (enrollment_presence), não recalculada por inscrição
+    elig = presence_eligibility(db, event, mode=job.mode, enrollment_ids=[e.id for e in enrollments])
+
+    job.status = CertificateJobStatus.running
+    job.started_at = _now()
+    job.heartbeat_at = _now()
+    job.total = len(enrollments)
+    db.commit()
+
+    pool = _render_pool()
+    chunk = max(1, settings.CERT_JOB_CHUNK)
+    results: List[dict] = []
+    for start in range(0, len(enrollments), chunk):
+        if _stopping.is_set():
+            # servidor encerrando: o que já foi emitido está gravado; o resto fica para outro job
+            raise JobInterrupted(
+                f"interrompido: servidor encerrado após {job.processed} de {job.total} inscrições"
+            )
+        batch = enrollments[start:start + chunk]
+
+        # 1) elegibilidade + HTML (ou fundo + campos) na thread do job (precisa da sessão);
+        #    códigos dos elegíveis do lote reservados de uma vez
+        codes = iter(new_verify_codes(sum(1 for e in batch if elig[e.id][0])))
+        pending: List[PendingCertificate] = []
+        for enr in batch:
+            try:
+                p = prepare_certificate(
+                    db=db, tenant=tenant, enrollment=enr,
+                    verify_url_base=verify_url_base, mode=job.mode, reissue=job.reissue,
+                    eligibility=elig[enr.id],
+                    verify_code=next(codes) if elig[enr.id][0] else None,
+                    lazy=settings.CERT_LAZY_PDF,
+                )
+            except Exception as e:
+                log.warning("certificado da inscrição %s: %s", enr.id, e)
+                results.append({"enrollment_id": enr.id, "status": "error", "detail": str(e)[:300]})
+                job.failed += 1
+                continue
+            if p is None:
+                results.append({"enrollment_id": enr.id, "status": "not_eligible"})
+                job.skipped += 1
+            else:
+                pending.append(p)
+
+        # 2) PDFs do lote em paralelo no pool de processos (sob demanda: nenhum)
+        futures: List[Optional[Future]] = [
+            pool.submit(render_pending_pdf, p) if pool and p.render_json is None else None for p in pending
+        ]
+
+        # 3) grava arquivos + linhas; um commit por lote
+        issued = []
+        for p, fut in zip(pending, futures):
+            try:
+                if p.render_json is not None:
+                    pdf = None
+                else:
+                    pdf = fut.result() if fut is not None else render_pending_pdf(p)
+                issued.append(finalize_certificate(db, tenant, p, pdf))
+            except Exception as e:
+                log.warning("certificado da inscrição %s: %s", p.enrollment_id, e)
+                results.append({"enrollment_id": p.enrollment_id, "status": "error", "detail": str(e)[:300]})
+                job.failed += 1
+        db.flush()
+        for cert in issued:
+            results.append({
+                "enrollment_id": cert.enrollment_id, "status": "issued",
+                "certificate_id": cert.id, "verify_code": cert.verify_code,
+            })
+        job.issued += len(issued)
+        job.processed += len(batch)
+        job.heartbeat_at = _now()
+        job.results_json = list(results)  # lista nova: JSON é marcado como alterado
+        db.commit()
+
+    job.status = CertificateJobStatus.done
+    job.finished_at = _now()
+    db.commit()
+
+def job_to_dict(job: CertificateJob, *, include_results: bool = True) -> dict:
+    status = job.status.value if hasattr(job.status, "value") else str(job.status)
+    out = {
+        "id": job.id,
+        "event_id": job.event_id,
+        "status": status,
+        "mode": job.mode,
+        "reissue": job.reissue,
+        "total": job.total,
+        "processed": job.processed,
+        "issued": job.issued,
+        "skipped": job.skipped,
+        "failed": job.failed,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if include_results:
+        out["results"] = job.results_json or []
+    return out
+
+def shutdown() -> None:
+    """
+    Jobs ainda na fila são cancelados e marcados failed; o que está rodando
+    para no próximo lote (JobInterrupted) e é marcado failed por run_job.
+    """
+    _stopping.set()
+    with _futures_lock:
+        futures = dict(_futures)
+    _runner.shutdown(wait=False, cancel_futures=True)
+    cancelled = [job_id for job_id, fut in futures.items() if fut.cancelled()]
+    if cancelled:
+        try:
+            with SessionLocal() as db:
+                _fail_jobs(db, CertificateJob.id.in_(cancelled), "cancelado: servidor encerrado antes do início")
+        except Exception:
+            log.exception("não foi possível marcar jobs cancelados como failed")
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
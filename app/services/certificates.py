@@ -1,14 +1,16 @@
 # app/services/certificates.py
 from __future__ import annotations
 
-import os, io, uuid, base64, datetime as dt
-from typing import Dict, Optional, Tuple
+import io, base64, hashlib, json, threading, datetime as dt
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, Tuple
 
 import sqlalchemy as sa
 from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 
-from jinja2 import Environment, BaseLoader, select_autoescape
+from jinja2 import Environment, BaseLoader, Template, select_autoescape
 
 # PDF (usa xhtml2pdf; fallback simples com reportlab se não estiver instalado)
 try:
@@ -23,8 +25,14 @@ try:
 except Exception:
     _HAS_REPORTLAB = False
 
-import qrcode  # type: ignore
+# motor vetorizado do modo 'hours' (opcional; sem numpy cai no laço em Python)
+try:
+    import numpy as np  # type: ignore
+    _HAS_NUMPY = True
+except Exception:
+    _HAS_NUMPY = False
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.models.client import Client
 from app.models.event import Event
@@ -33,20 +41,15 @@ from app.models.enrollment import Enrollment
 from app.models.day_event import DayEvent
 from app.models.attendance import Attendance
 from app.models.certificate import Certificate
+from app.services.attendance import as_utc
+from app.services.cert_overlay import OverlayRender, overlay_spec, render_overlay_pdf
+from app.services.qr import qr_png_data_uri
+from app.services.storage import StoredObject, get_storage
+from app.services.verification import mark_changed
+from app.services.verify_codes import new_verify_code
 
 # -------------------------- Utils --------------------------
 
-def _data_dir() -> str:
-    # vamos publicar em: /static/certificates/<tenant>/file.pdf
-    base = os.path.join(settings.DATA_DIR, "public", "certificates")
-    os.makedirs(base, exist_ok=True)
-    return base
-
-def _tenant_dir(tenant_slug: str) -> str:
-    path = os.path.join(_data_dir(), tenant_slug)
-    os.makedirs(path, exist_ok=True)
-    return path
-
 def _now_tz() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
@@ -59,20 +62,33 @@ def _mask_cpf(cpf: str | None) -> str:
     return cpf
 
 def _qr_data_uri(text: str) -> str:
-    img = qrcode.make(text)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    b64 = base64.b64encode(buf.getvalue()).decode("ascii")
-    return f"data:image/png;base64,{b64}"
-
-def _render_html(template: str, ctx: Dict) -> str:
-    env = Environment(
-        loader=BaseLoader(),
-        autoescape=select_autoescape(["html", "xml"]),
-        enable_async=False,
-    )
-    tpl = env.from_string(template)
-    return tpl.render(**ctx)
+    # PNG 1-bit pequeno (ver services/qr.py); xhtml2pdf lida melhor com PNG do que com SVG
+    return qr_png_data_uri(text)
+
+# um Environment para todos os templates; compilados ficam num LRU por
+# (client_id, sha256 do HTML) — trocar o template muda a chave
+_jinja = Environment(
+    loader=BaseLoader(),
+    autoescape=select_autoescape(["html", "xml"]),
+    enable_async=False,
+)
+TEMPLATE_CACHE_SIZE = 128
+_templates: TTLCache[Tuple[Optional[int], str], Template] = TTLCache(24 * 3600, maxsize=TEMPLATE_CACHE_SIZE)
+
+def _compiled_template(client_id: Optional[int], source: str) -> Template:
+    key = (client_id, hashlib.sha256(source.encode("utf-8")).hexdigest())
+    tpl = _templates.get(key)
+    if tpl is None:
+        tpl = _jinja.from_string(source)
+        _templates.set(key, tpl)
+    return tpl
+
+def invalidate_client_templates(client_id: int) -> None:
+    """Chamar após alterar certificate_template_html do cliente."""
+    _templates.pop_where(lambda k, _v: k[0] == client_id)
+
+def _render_html(template: str, ctx: Dict, client_id: Optional[int] = None) -> str:
+    return _compiled_template(client_id, template).render(**ctx)
 
 def _html_to_pdf_bytes(html: str) -> bytes:
     if _HAS_PISA:
@@ -92,97 +108,183 @@ def _html_to_pdf_bytes(html: str) -> bytes:
         return buf.getvalue()
     raise RuntimeError("Nenhum renderizador de PDF disponível (xhtml2pdf/reportlab)")
 
+def certificate_download_url(tenant_slug: str, verify_code: str) -> str:
+    # servido por GET /{tenant}/certificates/download/{code} (ETag + Range)
+    return f"/api/v1/{tenant_slug}/certificates/download/{verify_code}"
+
 def _save_pdf(tenant_slug: str, verify_code: str, pdf_bytes: bytes) -> Tuple[str, str]:
-    # path físico + URL pública (via StaticFiles /static)
-    dir_tenant = _tenant_dir(tenant_slug)
-    filename = f"{verify_code}.pdf"
-    path = os.path.join(dir_tenant, filename)
-    with open(path, "wb") as f:
-        f.write(pdf_bytes)
-    # URL que será servida pelo StaticFiles (ver main.py)
-    url = f"/static/certificates/{tenant_slug}/{filename}"
-    return path, url
-
-def _new_code(db: Session) -> str:
-    # 10 chars Base32 sem padding — curto e único
-    while True:
-        raw = uuid.uuid4().bytes
-        code = base64.b32encode(raw).decode("ascii").rstrip("=").lower()[:10]
-        exists = db.execute(select(Certificate).where(Certificate.verify_code == code)).scalar_one_or_none()
-        if not exists:
-            return code
+    # chave no storage configurado + URL pública de download
+    key = get_storage().put(tenant_slug, verify_code, pdf_bytes)
+    return key, certificate_download_url(tenant_slug, verify_code)
 
 # -------------------- Cálculo de presença --------------------
 
 class PresenceStats(Dict):
     pass
 
-def compute_presence_stats(
-    db: Session, enrollment: Enrollment, mode: str = "day"
-) -> PresenceStats:
+def _day_bounds(d: DayEvent) -> Tuple[dt.datetime, dt.datetime, int]:
+    start = dt.datetime.combine(d.date, d.start_time, tzinfo=dt.timezone.utc)
+    end = dt.datetime.combine(d.date, d.end_time, tzinfo=dt.timezone.utc)
+    return start, end, max(0, int((end - start).total_seconds() // 60))
+
+def compute_presence_stats_bulk(
+    db: Session,
+    event_id: int,
+    mode: str = "day",
+    enrollment_ids: Optional[Iterable[int]] = None,
+) -> Dict[int, PresenceStats]:
     """
-    mode= 'day'  -> presença por dia (conta presença se houve checkin)
-          'hours'-> soma minutos (checkout - checkin) capado ao horário do dia
+    Estatísticas de presença de várias inscrições do evento de uma vez
+    (todas, se enrollment_ids=None), com as mesmas regras de compute_presence_stats:
+      'day'   -> um COUNT agrupado por inscrição
+      'hours' -> uma consulta das presenças do evento; minutos capados em Python
     """
-    event = db.get(Event, enrollment.event_id)
-    if not event:
-        raise ValueError("event not found")
-
-    days = db.execute(select(DayEvent).where(DayEvent.event_id == event.id)).scalars().all()
+    if enrollment_ids is None:
+        ids = db.execute(select(Enrollment.id).where(Enrollment.event_id == event_id)).scalars().all()
+    else:
+        ids = list(enrollment_ids)
+    if not ids:
+        return {}
+
+    days = db.execute(select(DayEvent).where(DayEvent.event_id == event_id)).scalars().all()
     total_days = len(days)
     if total_days == 0:
-        return PresenceStats(total_days=0, present_days=0, pct=0.0, minutes=0, minutes_total=0)
+        return {
+            i: PresenceStats(total_days=0, present_days=0, pct=0.0, minutes=0, minutes_total=0)
+            for i in ids
+        }
+
+    day_ids = [d.id for d in days]
+    att_filter = [Attendance.day_event_id.in_(day_ids), Attendance.checkin_at.is_not(None)]
+    if enrollment_ids is not None:
+        att_filter.append(Attendance.enrollment_id.in_(ids))
 
     if mode == "day":
-        present_days = db.execute(
-            select(func.count(Attendance.id))
-            .where(
-                Attendance.enrollment_id == enrollment.id,
-                Attendance.day_event_id.in_([d.id for d in days]),
-                Attendance.checkin_at.is_not(None),
+        present = dict(db.execute(
+            select(Attendance.enrollment_id, func.count(Attendance.id))
+            .where(*att_filter)
+            .group_by(Attendance.enrollment_id)
+        ).all())
+        return {
+            i: PresenceStats(
+                total_days=total_days, present_days=present.get(i, 0),
+                pct=(present.get(i, 0) / total_days) * 100.0, minutes=0, minutes_total=0,
             )
-        ).scalar() or 0
-        pct = (present_days / total_days) * 100.0
-        return PresenceStats(
-            total_days=total_days, present_days=present_days, pct=pct, minutes=0, minutes_total=0
-        )
+            for i in ids
+        }
 
     # hours
-    minutes_total = 0
-    minutes = 0
-    for d in days:
-        start = dt.datetime.combine(d.date, d.start_time, tzinfo=dt.timezone.utc)
-        end = dt.datetime.combine(d.date, d.end_time, tzinfo=dt.timezone.utc)
-        dur = max(0, int((end - start).total_seconds() // 60))
-        minutes_total += dur
-
-        att = db.execute(
-            select(Attendance)
-            .where(Attendance.enrollment_id == enrollment.id, Attendance.day_event_id == d.id)
-        ).scalar_one_or_none()
-        if not att or not att.checkin_at:
+    bounds = {d.id: _day_bounds(d) for d in days}
+    minutes_total = sum(b[2] for b in bounds.values())
+    rows = db.execute(
+        select(Attendance.enrollment_id, Attendance.day_event_id, Attendance.checkin_at, Attendance.checkout_at)
+        .where(*att_filter)
+    ).all()
+    minutes = hours_minutes(rows, bounds, ids)
+
+    return {
+        i: PresenceStats(
+            total_days=total_days, present_days=None,
+            pct=(m / minutes_total) * 100.0 if minutes_total else 0.0,
+            minutes=m, minutes_total=minutes_total,
+        )
+        for i, m in minutes.items()
+    }
+
+# abaixo disso montar os arrays custa mais do que o laço
+NUMPY_MIN_ROWS = 256
+
+DayBounds = Dict[int, Tuple[dt.datetime, dt.datetime, int]]
+
+def hours_minutes(rows, bounds: DayBounds, ids: Iterable[int]) -> Dict[int, int]:
+    """Minutos por inscrição a partir de (enrollment_id, day_event_id, checkin_at, checkout_at)."""
+    engine = _hours_minutes_numpy if _HAS_NUMPY and len(rows) >= NUMPY_MIN_ROWS else _hours_minutes_python
+    return engine(rows, bounds, ids)
+
+def _hours_minutes_python(rows, bounds: DayBounds, ids: Iterable[int]) -> Dict[int, int]:
+    """Minutos por inscrição: presença capada ao horário do dia, no máximo a duração do dia."""
+    minutes: Dict[int, int] = dict.fromkeys(ids, 0)
+    for enr_id, day_id, chk_in, chk_out in rows:
+        if enr_id not in minutes:
             continue
-        chk_in = att.checkin_at
-        chk_out = att.checkout_at or end
-        # cap nos limites do dia
-        chk_in = max(chk_in, start)
-        chk_out = min(chk_out, end)
+        start, end, dur = bounds[day_id]
+        # cap nos limites do dia (SQLite devolve datetime naive: tratado como UTC)
+        chk_in = max(as_utc(chk_in), start)
+        chk_out = min(as_utc(chk_out) or end, end)
         gain = max(0, int((chk_out - chk_in).total_seconds() // 60))
-        minutes += min(gain, dur)
-
-    pct = (minutes / minutes_total) * 100.0 if minutes_total else 0.0
-    return PresenceStats(
-        total_days=total_days, present_days=None, pct=pct, minutes=minutes, minutes_total=minutes_total
+        minutes[enr_id] += min(gain, dur)
+    return minutes
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_EPOCH_NAIVE = _EPOCH.replace(tzinfo=None)  # SQLite: naive tratado como UTC
+_US = dt.timedelta(microseconds=1)
+
+def _us_array(values) -> "np.ndarray":
+    # µs desde a época em inteiro: exato (float perderia o arredondamento do minuto)
+    return np.fromiter(
+        ((v - (_EPOCH_NAIVE if v.tzinfo is None else _EPOCH)) // _US for v in values),
+        dtype=np.int64, count=len(values),
     )
 
+def _hours_minutes_numpy(rows, bounds: DayBounds, ids: Iterable[int]) -> Dict[int, int]:
+    """Mesma regra de _hours_minutes_python, com clamp/diferença/soma vetorizados (µs inteiros)."""
+    ids = list(ids)
+    pos = {i: k for k, i in enumerate(ids)}
+    rows = [r for r in rows if r[0] in pos]
+    if not rows:
+        return dict.fromkeys(ids, 0)
+
+    day_ids = list(bounds)
+    day_pos = {d: k for k, d in enumerate(day_ids)}
+    day_start = _us_array([bounds[d][0] for d in day_ids])
+    day_end = _us_array([bounds[d][1] for d in day_ids])
+    day_dur = np.array([bounds[d][2] for d in day_ids], dtype=np.int64)
+
+    enr_col, day_col, in_col, out_col = zip(*rows)
+    enr_idx = np.array([pos[e] for e in enr_col], dtype=np.int64)
+    d_idx = np.array([day_pos[d] for d in day_col], dtype=np.int64)
+    cin = _us_array(in_col)
+    has_out = np.array([v is not None for v in out_col], dtype=bool)
+    start = day_start[d_idx]
+    end = day_end[d_idx]
+    cout = end.copy()
+    if has_out.any():
+        cout[has_out] = _us_array([v for v in out_col if v is not None])
+
+    cin = np.maximum(cin, start)
+    cout = np.minimum(cout, end)
+    gain = np.maximum(0, (cout - cin) // 60_000_000)
+    gain = np.minimum(gain, day_dur[d_idx])
+
+    # bincount soma em float64: exato para inteiros abaixo de 2**53
+    totals = np.bincount(enr_idx, weights=gain, minlength=len(ids))
+    return {i: int(t) for i, t in zip(ids, totals.tolist())}
+
+def compute_presence_stats(
+    db: Session, enrollment: Enrollment, mode: str = "day"
+) -> PresenceStats:
+    """
+    mode= 'day'  -> presença por dia (conta presença se houve checkin)
+          'hours'-> soma minutos (checkout - checkin) capado ao horário do dia
+    """
+    event = db.get(Event, enrollment.event_id)
+    if not event:
+        raise ValueError("event not found")
+    return compute_presence_stats_bulk(db, event.id, mode=mode, enrollment_ids=[enrollment.id])[enrollment.id]
+
+def required_pct(event_pct: Optional[int], client_pct: Optional[int]) -> int:
+    if event_pct is not None:
+        return int(event_pct)
+    # fallback do cliente
+    if client_pct is not None:
+        return int(client_pct)
+    return 75  # padrão
+
 def min_presence_pct(db: Session, event: Event) -> int:
     if event.min_presence_pct is not None:
-        return int(event.min_presence_pct)
-    # fallback do cliente
+        return required_pct(event.min_presence_pct, None)
     cli = db.get(Client, event.client_id)
-    if cli and cli.default_min_presence_pct is not None:
-        return int(cli.default_min_presence_pct)
-    return 75  # padrão
+    return required_pct(None, cli.default_min_presence_pct if cli else None)
 
 def is_eligible(db: Session, enrollment: Enrollment, mode: str = "day") -> Tuple[bool, PresenceStats, int]:
     stats = compute_presence_stats(db, enrollment, mode=mode)
@@ -190,8 +292,30 @@ def is_eligible(db: Session, enrollment: Enrollment, mode: str = "day") -> Tuple
     req = min_presence_pct(db, ev)
     return (stats["pct"] >= req), stats, req
 
+Eligibility = Tuple[bool, PresenceStats, int]
+
+def eligibility_bulk(
+    db: Session, event: Event, mode: str = "day", enrollment_ids: Optional[Iterable[int]] = None
+) -> Dict[int, Eligibility]:
+    """is_eligible para várias inscrições do evento, via compute_presence_stats_bulk."""
+    req = min_presence_pct(db, event)
+    stats = compute_presence_stats_bulk(db, event.id, mode=mode, enrollment_ids=enrollment_ids)
+    return {i: (st["pct"] >= req, st, req) for i, st in stats.items()}
+
 # -------------------- Emissão/Reemissão --------------------
 
+def _event_context(client: Client, event: Event) -> Dict:
+    """Parte do contexto igual para todos os alunos do evento."""
+    return dict(
+        client=dict(nome=client.name, logo_url=client.logo_url),
+        evento=dict(
+            titulo=event.title,
+            inicio=event.start_at.date().isoformat() if event.start_at else "",
+            fim=event.end_at.date().isoformat() if event.end_at else "",
+        ),
+        carga_horas=event.workload_hours or 0,
+    )
+
 def build_certificate_html(
     *,
     client: Client,
@@ -201,6 +325,7 @@ def build_certificate_html(
     verify_code: str,
     stats: PresenceStats,
     required_pct: int,
+    issued_on: Optional[dt.date] = None,
 ) -> str:
     # template do cliente (Jinja2). Se não tiver, cria um básico.
     tpl = client.certificate_template_html or """
@@ -227,25 +352,81 @@ def build_certificate_html(
 
     qr = _qr_data_uri(verify_url)
 
-    carga = event.workload_hours or 0
-    inicio = event.start_at.date().isoformat() if event.start_at else ""
-    fim = event.end_at.date().isoformat() if event.end_at else ""
-
     ctx = dict(
-        client=dict(nome=client.name, logo_url=client.logo_url),
+        _event_context(client, event),
         aluno=dict(nome=student.name, cpf_mask=_mask_cpf(student.cpf)),
-        evento=dict(titulo=event.title, inicio=inicio, fim=fim),
-        emissao=dt.datetime.now().date().isoformat(),
+        emissao=(issued_on or dt.datetime.now().date()).isoformat(),
         codigo=verify_code,
         verify_url=verify_url,
         qr_data_uri=qr,
         stats=stats,
         required_pct=required_pct,
-        carga_horas=carga,
     )
-    return _render_html(tpl, ctx)
+    return _render_html(tpl, ctx, client_id=client.id)
+
+# fundo do modo overlay, já em PDF, por (cliente, evento, hash do que o compõe)
+_backgrounds: TTLCache[Tuple[int, int, str], bytes] = TTLCache(24 * 3600, maxsize=64)
+
+def _overlay_background(client: Client, event: Event, spec: dict, ev_ctx: Dict) -> bytes:
+    # spec ou dados do evento mudaram -> chave nova; a antiga expira sozinha
+    digest = hashlib.sha256(
+        json.dumps([spec["background_html"], ev_ctx], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    key = (client.id, event.id, digest)
+    pdf = _backgrounds.get(key)
+    if pdf is None:
+        pdf = _html_to_pdf_bytes(_render_html(spec["background_html"], ev_ctx, client_id=client.id))
+        _backgrounds.set(key, pdf)
+    return pdf
+
+def build_certificate_overlay(
+    *,
+    client: Client,
+    event: Event,
+    student: Student,
+    verify_url: str,
+    verify_code: str,
+    stats: PresenceStats,
+    required_pct: int,
+    spec: dict,
+    issued_on: Optional[dt.date] = None,
+) -> OverlayRender:
+    """Fundo do evento (cacheado) + valores do aluno para render_overlay_pdf."""
+    ev_ctx = _event_context(client, event)
+    values = dict(
+        nome=student.name,
+        cpf_mask=_mask_cpf(student.cpf),
+        titulo=event.title,
+        carga_horas=ev_ctx["carga_horas"],
+        pct=round(stats["pct"], 2),
+        required_pct=required_pct,
+        codigo=verify_code,
+        emissao=(issued_on or dt.datetime.now().date()).isoformat(),
+        verify_url=verify_url,
+    )
+    return OverlayRender(
+        background=_overlay_background(client, event, spec, ev_ctx),
+        fields=spec["fields"],
+        values=values,
+    )
 
-def issue_certificate_for_enrollment(
+@dataclass
+class PendingCertificate:
+    """Certificado com HTML (ou fundo + campos) pronto, aguardando o PDF (ver issue_certificate_for_enrollment)."""
+    enrollment_id: int
+    verify_code: str
+    html: str
+    reissue: bool = False
+    overlay: Optional[OverlayRender] = None
+    render_json: Optional[dict] = None  # modo sob demanda: sem HTML, o PDF sai no primeiro download
+
+def render_pending_pdf(pending: PendingCertificate) -> bytes:
+    """PDF do certificado preparado; roda também nos processos do pool de emissão."""
+    if pending.overlay is not None:
+        return render_overlay_pdf(pending.overlay)
+    return _html_to_pdf_bytes(pending.html)
+
+def prepare_certificate(
     *,
     db: Session,
     tenant: Client,
@@ -253,42 +434,180 @@ def issue_certificate_for_enrollment(
     verify_url_base: str,
     mode: str = "day",
     reissue: bool = False,
-) -> Optional[Certificate]:
-    ok, stats, req = is_eligible(db, enrollment, mode=mode)
+    eligibility: Optional[Eligibility] = None,
+    verify_code: Optional[str] = None,
+    lazy: bool = False,
+) -> Optional[PendingCertificate]:
+    """
+    Elegibilidade, código e HTML — só leitura; a revogação fica para o finalize.
+    `eligibility` pré-calculada (presence_eligibility/eligibility_bulk) evita as consultas por inscrição;
+    `verify_code` vem de new_verify_codes(n) quando o lote reserva os códigos de uma vez.
+    `lazy`: não monta HTML; guarda só o necessário para ensure_certificate_pdf.
+    """
+    ok, stats, req = eligibility or is_eligible(db, enrollment, mode=mode)
     if not ok:
         return None
 
-    # revoga anterior, se reissue=True
-    if reissue:
-        db.execute(
-            sa.update(Certificate)
-            .where(Certificate.enrollment_id == enrollment.id, Certificate.status == "issued")
-            .values(status="revoked")
-        )
-
-    code = _new_code(db)
+    code = verify_code or new_verify_code()
     verify_url = f"{verify_url_base.rstrip('/')}/{code}"
+    if lazy:
+        return PendingCertificate(
+            enrollment_id=enrollment.id, verify_code=code, html="", reissue=reissue,
+            render_json=dict(mode=mode, stats=dict(stats), required_pct=req, verify_url=verify_url),
+        )
 
     # carrega dados
     event = db.get(Event, enrollment.event_id)
     student = db.get(Student, enrollment.student_id)
+    spec = overlay_spec(tenant.config_json)
+    if spec is not None:
+        # fundo + campos: o HTML completo não é renderizado por aluno
+        overlay = build_certificate_overlay(
+            client=tenant, event=event, student=student,
+            verify_url=verify_url, verify_code=code,
+            stats=stats, required_pct=req, spec=spec,
+        )
+        return PendingCertificate(enrollment_id=enrollment.id, verify_code=code, html="",
+                                  reissue=reissue, overlay=overlay)
     html = build_certificate_html(
         client=tenant, event=event, student=student,
         verify_url=verify_url, verify_code=code,
         stats=stats, required_pct=req,
     )
+    return PendingCertificate(enrollment_id=enrollment.id, verify_code=code, html=html, reissue=reissue)
 
-    pdf_bytes = _html_to_pdf_bytes(html)
-    _, pdf_url = _save_pdf(tenant.slug, code, pdf_bytes)
+def finalize_certificate(
+    db: Session, tenant: Client, pending: PendingCertificate, pdf_bytes: Optional[bytes]
+) -> Certificate:
+    """
+    Grava o PDF, revoga o anterior (reissue) e adiciona o certificado. Não faz commit.
+    `pdf_bytes` None (modo sob demanda): só a linha, com render_json; o PDF fica para o download.
+    """
+    if pdf_bytes is None:
+        if pending.render_json is None:
+            raise ValueError("certificado sem PDF precisa de render_json")
+        pdf_url = certificate_download_url(tenant.slug, pending.verify_code)
+    else:
+        _, pdf_url = _save_pdf(tenant.slug, pending.verify_code, pdf_bytes)
+
+    # revoga anterior só com o PDF novo pronto: falha na renderização não deixa o aluno sem certificado
+    revoked: list[str] = []
+    if pending.reissue:
+        revoked = list(db.execute(
+            sa.update(Certificate)
+            .where(Certificate.enrollment_id == pending.enrollment_id, Certificate.status == "issued")
+            .values(status="revoked")
+            .returning(Certificate.verify_code)
+        ).scalars())
+    # código novo também: pode haver "não encontrado" em cache de uma consulta anterior
+    mark_changed(db, revoked + [pending.verify_code])
 
     cert = Certificate(
-        enrollment_id=enrollment.id,
+        enrollment_id=pending.enrollment_id,
         issued_at=_now_tz(),
         pdf_url=pdf_url,
-        verify_code=code,
+        verify_code=pending.verify_code,
         status="issued",
+        render_json=pending.render_json if pdf_bytes is None else None,
     )
     db.add(cert)
+    return cert
+
+def issue_certificate_for_enrollment(
+    *,
+    db: Session,
+    tenant: Client,
+    enrollment: Enrollment,
+    verify_url_base: str,
+    mode: str = "day",
+    reissue: bool = False,
+    eligibility: Optional[Eligibility] = None,
+    verify_code: Optional[str] = None,
+    lazy: Optional[bool] = None,
+) -> Optional[Certificate]:
+    """`lazy` None segue settings.CERT_LAZY_PDF: emissão só no banco, PDF no primeiro download."""
+    pending = prepare_certificate(
+        db=db, tenant=tenant, enrollment=enrollment,
+        verify_url_base=verify_url_base, mode=mode, reissue=reissue,
+        eligibility=eligibility, verify_code=verify_code,
+        lazy=settings.CERT_LAZY_PDF if lazy is None else lazy,
+    )
+    if pending is None:
+        return None
+
+    pdf_bytes = None if pending.render_json is not None else render_pending_pdf(pending)
+    cert = finalize_certificate(db, tenant, pending, pdf_bytes)
     db.commit()
     db.refresh(cert)
     return cert
+
+# -------------------- PDF sob demanda --------------------
+
+class _CodeLocks:
+    """Um lock por código, criado no primeiro pedido e descartado quando ninguém mais espera."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[str, list] = {}  # código -> [lock, quantos usam]
+
+    @contextmanager
+    def hold(self, code: str) -> Iterator[None]:
+        with self._lock:
+            entry = self._locks.setdefault(code, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[code]
+
+_render_locks = _CodeLocks()
+
+def _pending_from_snapshot(db: Session, tenant: Client, cert: Certificate) -> PendingCertificate:
+    """Refaz o que prepare_certificate montaria na emissão, com os números gravados nela."""
+    snap = cert.render_json
+    enrollment = db.get(Enrollment, cert.enrollment_id)
+    event = db.get(Event, enrollment.event_id)
+    student = db.get(Student, enrollment.student_id)
+    kwargs = dict(
+        client=tenant, event=event, student=student,
+        verify_url=snap["verify_url"], verify_code=cert.verify_code,
+        stats=PresenceStats(snap["stats"]), required_pct=snap["required_pct"],
+        issued_on=as_utc(cert.issued_at).astimezone().date(),  # data local, como na emissão
+    )
+    spec = overlay_spec(tenant.config_json)
+    if spec is not None:
+        return PendingCertificate(enrollment_id=enrollment.id, verify_code=cert.verify_code, html="",
+                                  overlay=build_certificate_overlay(spec=spec, **kwargs))
+    return PendingCertificate(enrollment_id=enrollment.id, verify_code=cert.verify_code,
+                              html=build_certificate_html(**kwargs))
+
+def ensure_certificate_pdf(db: Session, tenant: Client, verify_code: str) -> Optional[StoredObject]:
+    """
+    PDF no storage, gerando-o se o certificado foi emitido sob demanda e ainda
+    não foi baixado. Um render por código: lock por código neste processo e,
+    entre processos, lock da linha (Postgres; o SQLite ignora FOR UPDATE).
+    Faz commit da sessão para soltar o lock. None se não há o que servir.
+    """
+    storage = get_storage()
+    obj = storage.stat(tenant.slug, verify_code)
+    if obj is not None:
+        return obj
+    with _render_locks.hold(verify_code):
+        cert = db.execute(
+            select(Certificate)
+            .where(Certificate.verify_code == verify_code, Certificate.status == "issued")
+            .with_for_update()
+        ).scalar_one_or_none()
+        try:
+            # quem segurava o lock pode ter acabado de gravar
+            obj = storage.stat(tenant.slug, verify_code)
+            if obj is None and cert is not None and cert.render_json is not None:
+                storage.put(tenant.slug, verify_code, render_pending_pdf(_pending_from_snapshot(db, tenant, cert)))
+                obj = storage.stat(tenant.slug, verify_code)
+        finally:
+            db.commit()
+    return obj
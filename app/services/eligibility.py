@@ -0,0 +1,251 @@
+# app/services/eligibility.py
+#
+# Elegibilidade persistida (enrollment_presence): uma linha por inscrição com
+# dias presentes, minutos, % e o flag de elegível nos dois modos. As linhas das
+# inscrições afetadas são recalculadas no flush que grava presenças (portaria,
+# CRUDAttendance, sync offline — todos passam pelo ORM), na mesma transação.
+# Mudança de dias do evento ou de % mínimo só marca stale; a leitura recalcula
+# em lote o que estiver stale ou ausente. Checagens viram leitura por chave/índice.
+from __future__ import annotations
+
+import datetime as dt
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.attendance import Attendance
+from app.models.client import Client
+from app.models.day_event import DayEvent
+from app.models.enrollment import Enrollment
+from app.models.enrollment_presence import EnrollmentPresence
+from app.models.event import Event
+from app.services.certificates import (
+    Eligibility,
+    PresenceStats,
+    _day_bounds,
+    hours_minutes,
+    required_pct,
+)
+
+_VALUE_COLUMNS = (
+    "event_id", "total_days", "present_days", "minutes_total", "minutes", "required_pct",
+    "day_pct", "hours_pct", "eligible_day", "eligible_hours", "stale",
+)
+
+# ------------------------ cálculo e gravação ------------------------
+
+def _computed_rows(db: Session, event_id: int, req: int, enrollment_ids: List[int]) -> List[dict]:
+    """
+    Mesmas regras de compute_presence_stats_bulk ('day' e 'hours') a partir de
+    uma única leitura das presenças — roda no flush da portaria, então conta
+    cada consulta.
+    """
+    days = db.execute(
+        select(DayEvent.id, DayEvent.date, DayEvent.start_time, DayEvent.end_time)
+        .where(DayEvent.event_id == event_id)
+    ).all()
+    bounds = {d.id: _day_bounds(d) for d in days}
+    total_days = len(bounds)
+    minutes_total = sum(b[2] for b in bounds.values())
+    rows = db.execute(
+        select(Attendance.enrollment_id, Attendance.day_event_id, Attendance.checkin_at, Attendance.checkout_at)
+        .where(
+            Attendance.enrollment_id.in_(enrollment_ids),
+            Attendance.day_event_id.in_(list(bounds)),
+            Attendance.checkin_at.is_not(None),
+        )
+    ).all() if bounds else []
+    present: Dict[int, int] = {}
+    for r in rows:
+        present[r[0]] = present.get(r[0], 0) + 1
+    minutes = hours_minutes(rows, bounds, enrollment_ids) if rows else dict.fromkeys(enrollment_ids, 0)
+
+    out = []
+    for i in enrollment_ids:
+        p, m = present.get(i, 0), minutes[i]
+        day_pct = (p / total_days) * 100.0 if total_days else 0.0
+        hours_pct = (m / minutes_total) * 100.0 if minutes_total else 0.0
+        out.append(dict(
+            enrollment_id=i, event_id=event_id,
+            total_days=total_days, present_days=p, minutes_total=minutes_total, minutes=m,
+            required_pct=req, day_pct=day_pct, hours_pct=hours_pct,
+            eligible_day=day_pct >= req, eligible_hours=hours_pct >= req,
+            stale=False,
+        ))
+    return out
+
+def _upsert(conn: Connection, rows: List[dict]) -> None:
+    t = EnrollmentPresence.__table__
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(t)
+        set_ = {k: stmt.excluded[k] for k in _VALUE_COLUMNS}
+        set_["updated_at"] = stmt.excluded.updated_at
+        conn.execute(stmt.on_conflict_do_update(index_elements=[t.c.enrollment_id], set_=set_), rows)
+        return
+    # outros bancos: UPDATE e, se não havia linha, INSERT
+    for row in rows:
+        values = {k: row[k] for k in _VALUE_COLUMNS}
+        res = conn.execute(update(t).where(t.c.enrollment_id == row["enrollment_id"]).values(**values))
+        if res.rowcount == 0:
+            conn.execute(t.insert().values(**row))
+
+def refresh_presence(db: Session, enrollment_ids: Iterable[int]) -> int:
+    """Recalcula e grava as linhas das inscrições (sem commit). Retorna quantas."""
+    ids = sorted(set(enrollment_ids))  # ordem fixa: evita deadlock entre transações
+    if not ids:
+        return 0
+    per_event: Dict[Tuple[int, int], List[int]] = {}
+    for enr_id, event_id, event_pct, client_pct in db.execute(
+        select(Enrollment.id, Enrollment.event_id, Event.min_presence_pct, Client.default_min_presence_pct)
+        .join(Event, Event.id == Enrollment.event_id)
+        .join(Client, Client.id == Event.client_id)
+        .where(Enrollment.id.in_(ids))
+        .order_by(Enrollment.id)
+        # Postgres: duas transações com presenças da mesma inscrição se
+        # enfileiram aqui, e a segunda recalcula já vendo o commit da primeira
+        .with_for_update(of=Enrollment, key_share=True)
+    ).all():
+        per_event.setdefault((event_id, required_pct(event_pct, client_pct)), []).append(enr_id)
+    rows: List[dict] = []
+    for (event_id, req), enr_ids in sorted(per_event.items()):
+        rows.extend(_computed_rows(db, event_id, req, enr_ids))
+    if rows:
+        now = dt.datetime.now(dt.timezone.utc)
+        for r in rows:
+            r["updated_at"] = now
+        _upsert(db.connection(), rows)
+    return len(rows)
+
+def mark_stale(db: Session, *, event_ids: Iterable[int] = (), client_ids: Iterable[int] = ()) -> None:
+    """Regra do evento mudou (dias, % mínimo): recalcula na próxima leitura."""
+    t = EnrollmentPresence.__table__
+    conds = []
+    event_ids, client_ids = list(event_ids), list(client_ids)
+    if event_ids:
+        conds.append(t.c.event_id.in_(event_ids))
+    if client_ids:
+        conds.append(t.c.event_id.in_(select(Event.id).where(Event.client_id.in_(client_ids))))
+    if conds:
+        db.connection().execute(update(t).where(or_(*conds), t.c.stale.is_(False)).values(stale=True))
+
+# ------------------------ leitura ------------------------
+
+def _stats(p: EnrollmentPresence, mode: str) -> PresenceStats:
+    # reconstrói exatamente o dict de compute_presence_stats_bulk
+    if p.total_days == 0:
+        return PresenceStats(total_days=0, present_days=0, pct=0.0, minutes=0, minutes_total=0)
+    if mode == "day":
+        return PresenceStats(
+            total_days=p.total_days, present_days=p.present_days,
+            pct=p.day_pct, minutes=0, minutes_total=0,
+        )
+    return PresenceStats(
+        total_days=p.total_days, present_days=None,
+        pct=p.hours_pct, minutes=p.minutes, minutes_total=p.minutes_total,
+    )
+
+def _ensure_fresh(db: Session, event_id: int, enrollment_ids: Optional[List[int]]) -> None:
+    """Calcula, numa transação curta à parte, as linhas ausentes ou stale."""
+    P = EnrollmentPresence
+    stmt = (
+        select(Enrollment.id)
+        .outerjoin(P, P.enrollment_id == Enrollment.id)
+        .where(Enrollment.event_id == event_id, or_(P.enrollment_id.is_(None), P.stale.is_(True)))
+    )
+    if enrollment_ids is not None:
+        stmt = stmt.where(Enrollment.id.in_(enrollment_ids))
+    missing = db.execute(stmt).scalars().all()
+    if not missing:
+        return
+    if db.info.get(_WROTE_KEY):
+        # a transação do chamador já escreveu em enrollment_presence: outra
+        # sessão esperaria pelos locks dela; grava aqui e vai no commit dele
+        refresh_presence(db, missing)
+        return
+    with SessionLocal() as fresh:
+        refresh_presence(fresh, missing)
+        fresh.commit()
+
+def presence_eligibility(
+    db: Session, event: Event, mode: str = "day", enrollment_ids: Optional[Iterable[int]] = None
+) -> Dict[int, Eligibility]:
+    """Mesmo resultado de eligibility_bulk, lido de enrollment_presence."""
+    ids = None if enrollment_ids is None else list(enrollment_ids)
+    if ids is not None and not ids:
+        return {}
+    _ensure_fresh(db, event.id, ids)
+    P = EnrollmentPresence
+    stmt = select(P).where(P.event_id == event.id)
+    if ids is not None:
+        stmt = stmt.where(P.enrollment_id.in_(ids))
+    out: Dict[int, Eligibility] = {}
+    for p in db.execute(stmt.execution_options(populate_existing=True)).scalars():
+        eligible = p.eligible_day if mode == "day" else p.eligible_hours
+        out[p.enrollment_id] = (eligible, _stats(p, mode), p.required_pct)
+    return out
+
+def enrollment_eligibility(db: Session, enrollment: Enrollment, mode: str = "day") -> Eligibility:
+    """is_eligible por leitura de chave primária."""
+    ev = db.get(Event, enrollment.event_id)
+    if not ev:
+        raise ValueError("event not found")
+    return presence_eligibility(db, ev, mode=mode, enrollment_ids=[enrollment.id])[enrollment.id]
+
+def eligible_enrollment_ids(db: Session, event: Event, mode: str = "day") -> List[int]:
+    """Inscrições elegíveis do evento (índice event_id + flag do modo)."""
+    _ensure_fresh(db, event.id, None)
+    P = EnrollmentPresence
+    flag = P.eligible_day if mode == "day" else P.eligible_hours
+    return db.execute(
+        select(P.enrollment_id).where(P.event_id == event.id, flag.is_(True)).order_by(P.enrollment_id)
+    ).scalars().all()
+
+# ------------------------ atualização no flush ------------------------
+
+_WROTE_KEY = "enrollment_presence_written"
+
+def _changed(obj, *attrs: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+def _affected(session: Session) -> Tuple[Set[int], Set[int], Set[int]]:
+    enrollments: Set[int] = set()
+    events: Set[int] = set()
+    clients: Set[int] = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Attendance):
+            if obj in session.dirty and not _changed(obj, "checkin_at", "checkout_at", "day_event_id", "enrollment_id"):
+                continue
+            enrollments.add(obj.enrollment_id)
+        elif isinstance(obj, DayEvent):
+            # dia novo/removido/alterado muda total de dias e de minutos
+            events.add(obj.event_id)
+        elif isinstance(obj, Event) and obj in session.dirty:
+            if _changed(obj, "min_presence_pct"):
+                events.add(obj.id)
+        elif isinstance(obj, Client) and obj in session.dirty:
+            if _changed(obj, "default_min_presence_pct"):
+                clients.add(obj.id)
+    return enrollments, events, clients
+
+@event.listens_for(Session, "after_flush")
+def _refresh_on_flush(session: Session, _flush_context) -> None:
+    # mesmo padrão dos contadores do dia (services/occupancy): mesma transação
+    enrollments, events, clients = _affected(session)
+    if events or clients:
+        mark_stale(session, event_ids=events, client_ids=clients)
+    if enrollments:
+        refresh_presence(session, enrollments)
+    if enrollments or events or clients:
+        session.info[_WROTE_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _transaction_ended(session: Session) -> None:
+    session.info.pop(_WROTE_KEY, None)
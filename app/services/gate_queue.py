@@ -0,0 +1,185 @@
+# app/services/gate_queue.py
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.attendance import Scan, apply_scans
+
+log = logging.getLogger(__name__)
+
+# métricas expostas em /metrics (Instrumentator usa o registry padrão)
+QUEUE_DEPTH = Gauge("gate_write_behind_queue_depth", "Scans aceitos aguardando gravação")
+FLUSHED = Counter("gate_write_behind_flushed_total", "Scans gravados pelo flusher")
+DROPPED = Counter("gate_write_behind_dropped_total", "Checkouts descartados por falta de checkin")
+FLUSH_ERRORS = Counter("gate_write_behind_flush_errors_total", "Falhas ao gravar um lote (lote é re-tentado)")
+DEAD_LETTERED = Counter("gate_write_behind_dead_lettered_total", "Scans descartados por falharem sozinhos (dead letter)")
+
+def _transient(err: Exception) -> bool:
+    # banco fora/travado: re-tentar resolve; dividir o lote só multiplicaria as falhas
+    if isinstance(err, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(err, DBAPIError) and bool(err.connection_invalidated)
+
+class WriteBehindQueue:
+    """
+    Fila em processo para scans já validados: a portaria recebe o ACK na hora
+    e uma thread grava em lote (a cada `interval_ms` ou `max_batch` itens)
+    via apply_scans, numa transação por lote. Lote com erro é re-tentado com
+    backoff; depois de GATE_FLUSH_MAX_RETRIES falhas que não são de conexão,
+    é dividido ao meio até isolar os scans que falham sozinhos (dead letter:
+    log + métrica) e o resto é gravado. stop() drena a fila antes de encerrar.
+    """
+
+    def __init__(self, *, interval_ms: int, max_batch: int, maxsize: int):
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self._q: "queue.Queue[Scan]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        QUEUE_DEPTH.set_function(self._q.qsize)
+
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def start(self) -> None:
+        with self._start_lock:
+            self._start_locked()
+
+    def _start_locked(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gate-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, scan: Scan) -> bool:
+        """
+        Enfileira; False se a fila estiver cheia ou já encerrada por stop()
+        (caller grava de forma síncrona). Só start() reabre a fila depois do stop.
+        """
+        # sob o lock: stop() não pode encerrar entre a checagem e o put,
+        # senão o scan ficaria na fila depois da última drenagem
+        with self._start_lock:
+            if self._stop.is_set():
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._start_locked()
+            try:
+                self._q.put_nowait(scan)
+                return True
+            except queue.Full:
+                return False
+
+    def stop(self, timeout: float = 30.0) -> None:
+        with self._start_lock:
+            self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self.depth():
+            log.error("write-behind encerrado com %d scans não gravados", self.depth())
+
+    # ------------------------------------------------------------------
+
+    def _collect(self, pending: List[Scan]) -> None:
+        deadline = time.monotonic() + self.interval
+        while len(pending) < self.max_batch:
+            remaining = 0 if self._stop.is_set() else deadline - time.monotonic()
+            try:
+                pending.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                return
+
+    def _write(self, scans: List[Scan], *, quiet: bool = False) -> Optional[Exception]:
+        """None se gravou; senão o erro (o lote inteiro foi desfeito)."""
+        try:
+            with SessionLocal() as db:
+                atts = apply_scans(db, scans)
+                db.commit()
+        except Exception as e:
+            FLUSH_ERRORS.inc()
+            if quiet:
+                log.debug("falha ao gravar %d scans (isolando): %s", len(scans), e)
+            else:
+                log.exception("falha ao gravar lote de %d scans (write-behind)", len(scans))
+            return e
+        dropped = sum(1 for a in atts if a is None)
+        if dropped:
+            DROPPED.inc(dropped)
+        FLUSHED.inc(len(scans) - dropped)
+        return None
+
+    def _isolate(self, scans: List[Scan]) -> List[Scan]:
+        """
+        Divide o lote ao meio até achar os scans que falham sozinhos; grava o
+        resto. Devolve os que falharam por erro transitório (voltam para a fila
+        de re-tentativa), na ordem original.
+        """
+        if len(scans) == 1:
+            err = self._write(scans, quiet=True)
+            if err is None:
+                return []
+            if _transient(err):
+                return scans
+            s = scans[0]
+            DEAD_LETTERED.inc()
+            log.error(
+                "write-behind: scan descartado (dead letter) enrollment_id=%s day_event_id=%s action=%s at=%s: %s",
+                s.enrollment_id, s.day_event_id, s.action, s.at.isoformat(), err,
+            )
+            return []
+        retry: List[Scan] = []
+        mid = len(scans) // 2
+        # metade da esquerda antes: checkin e checkout da mesma chave seguem em ordem
+        for part in (scans[:mid], scans[mid:]):
+            if self._write(part, quiet=True) is not None:
+                retry.extend(self._isolate(part))
+        return retry
+
+    def _run(self) -> None:
+        pending: List[Scan] = []
+        backoff = 0.0
+        failures = 0
+        while True:
+            if not pending:
+                try:
+                    pending.append(self._q.get(timeout=0.5))
+                except queue.Empty:
+                    if self._stop.is_set():
+                        return
+                    continue
+            self._collect(pending)
+            err = self._write(pending)
+            if err is None:
+                pending = []
+                backoff = failures = 0
+                continue
+            failures += 1
+            if failures >= settings.GATE_FLUSH_MAX_RETRIES and not _transient(err):
+                # falha que se repete: um scan ruim (ex.: inscrição apagada após o ACK)
+                # não pode segurar todos os que chegaram depois dele
+                pending = self._isolate(pending)
+                failures = 0
+                if not pending:
+                    backoff = 0.0
+                    continue
+            if self._stop.is_set() and backoff >= 5.0:
+                log.error("descartando %d scans após falhas repetidas no shutdown", len(pending))
+                return
+            backoff = min(5.0, (backoff * 2) or 0.1)
+            time.sleep(backoff)
+
+write_behind = WriteBehindQueue(
+    interval_ms=settings.GATE_FLUSH_INTERVAL_MS,
+    max_batch=settings.GATE_FLUSH_MAX_ITEMS,
+    maxsize=settings.GATE_QUEUE_MAXSIZE,
+)
@@ -0,0 +1,277 @@
+# app/services/occupancy.py
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import case, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.attendance import Attendance
+from app.models.day_event import DayEvent
+from app.models.day_event_counter import DayEventCounter
+from app.services.attendance import as_utc
+
+Flags = Tuple[int, int, int]  # (checked_in, checked_out, inside)
+
+COUNTER_NAMES = ("checked_in", "checked_out", "inside")
+
+def presence_flags(checkin_at: Optional[dt.datetime], checkout_at: Optional[dt.datetime]) -> Flags:
+    """Contribuição de uma linha de attendances para os contadores do dia."""
+    cin = checkin_at is not None
+    cout = checkout_at is not None
+    # re-entrada depois de um checkout deixa checkin_at > checkout_at: está dentro
+    inside = cin and (not cout or as_utc(checkout_at) < as_utc(checkin_at))
+    return int(cin), int(cout), int(inside)
+
+def counts_query():
+    """Mesmas regras de presence_flags, agregadas em SQL (agrupar por dia)."""
+    return select(
+        Attendance.day_event_id,
+        func.count(Attendance.checkin_at),
+        func.count(Attendance.checkout_at),
+        func.coalesce(func.sum(case(
+            (Attendance.checkin_at.is_(None), 0),
+            (Attendance.checkout_at.is_(None), 1),
+            (Attendance.checkout_at < Attendance.checkin_at, 1),
+            else_=0,
+        )), 0),
+    ).group_by(Attendance.day_event_id)
+
+# ------------------------ contadores persistidos ------------------------
+
+def get_counters(db: Session, day_event_id: int) -> Dict[str, int]:
+    """Leitura O(1) de day_event_counters (sem linha = dia sem presenças)."""
+    row = db.get(DayEventCounter, day_event_id)
+    if row is None:
+        return dict.fromkeys(COUNTER_NAMES, 0)
+    return {k: getattr(row, k) for k in COUNTER_NAMES}
+
+def _upsert(conn: Connection, day_event_id: int, values: Dict[str, int], *, increment: bool) -> None:
+    t = DayEventCounter.__table__
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(t).values(day_event_id=day_event_id, **values)
+        set_ = {
+            k: (t.c[k] + stmt.excluded[k]) if increment else stmt.excluded[k]
+            for k in COUNTER_NAMES
+        }
+        set_["updated_at"] = func.now()
+        conn.execute(stmt.on_conflict_do_update(index_elements=[t.c.day_event_id], set_=set_))
+        return
+    # outros bancos: UPDATE e, se não havia linha, INSERT
+    set_ = {k: (t.c[k] + v) if increment else v for k, v in values.items()}
+    res = conn.execute(update(t).where(t.c.day_event_id == day_event_id).values(**set_, updated_at=func.now()))
+    if res.rowcount == 0:
+        conn.execute(t.insert().values(day_event_id=day_event_id, **values))
+
+def apply_counter_deltas(conn: Connection, changes: Iterable["AttendanceChange"]) -> None:
+    per_day: Dict[int, List[int]] = {}
+    for ch in changes:
+        acc = per_day.setdefault(ch.day_event_id, [0, 0, 0])
+        for i, d in enumerate(ch.delta):
+            acc[i] += d
+    for day_id, acc in sorted(per_day.items()):  # ordem fixa: evita deadlock entre lotes
+        if any(acc):
+            _upsert(conn, day_id, dict(zip(COUNTER_NAMES, acc)), increment=True)
+
+def reconcile_counters(db: Session, day_event_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula day_event_counters a partir das linhas de attendances
+    (todos os dias, ou só os informados). Faz commit; retorna dias gravados.
+    """
+    days = select(DayEvent.id)
+    agg = counts_query()
+    if day_event_ids is not None:
+        ids = list(day_event_ids)
+        days = days.where(DayEvent.id.in_(ids))
+        agg = agg.where(Attendance.day_event_id.in_(ids))
+    totals = {r[0]: dict(zip(COUNTER_NAMES, (int(v or 0) for v in r[1:]))) for r in db.execute(agg)}
+    conn = db.connection()
+    n = 0
+    for (day_id,) in db.execute(days).all():
+        _upsert(conn, day_id, totals.get(day_id, dict.fromkeys(COUNTER_NAMES, 0)), increment=False)
+        n += 1
+    db.commit()
+    return n
+
+# ------------------------ mudanças capturadas no flush ------------------------
+
+@dataclass(frozen=True)
+class AttendanceChange:
+    day_event_id: int
+    enrollment_id: int
+    checkin_at: Optional[dt.datetime]
+    checkout_at: Optional[dt.datetime]
+    before: Flags
+    after: Flags
+    checkin_changed: bool
+    deleted: bool = False
+
+    @property
+    def delta(self) -> Flags:
+        return tuple(a - b for a, b in zip(self.after, self.before))  # type: ignore[return-value]
+
+def _previous(obj: Attendance, attr: str):
+    hist = inspect(obj).attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return None
+
+def _changes_in_flush(session: Session) -> List[AttendanceChange]:
+    out: List[AttendanceChange] = []
+    for obj in session.deleted:
+        if not isinstance(obj, Attendance):
+            continue
+        # linha removida: sai dos contadores com o estado que estava gravado
+        prev_in, prev_out = _previous(obj, "checkin_at"), _previous(obj, "checkout_at")
+        out.append(AttendanceChange(
+            day_event_id=obj.day_event_id,
+            enrollment_id=obj.enrollment_id,
+            checkin_at=None,
+            checkout_at=None,
+            before=presence_flags(prev_in, prev_out),
+            after=(0, 0, 0),
+            checkin_changed=False,
+            deleted=True,
+        ))
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Attendance):
+            continue
+        is_new = obj in session.new
+        prev_in = None if is_new else _previous(obj, "checkin_at")
+        prev_out = None if is_new else _previous(obj, "checkout_at")
+        if not is_new and prev_in == obj.checkin_at and prev_out == obj.checkout_at:
+            continue
+        out.append(AttendanceChange(
+            day_event_id=obj.day_event_id,
+            enrollment_id=obj.enrollment_id,
+            checkin_at=obj.checkin_at,
+            checkout_at=obj.checkout_at,
+            before=presence_flags(prev_in, prev_out),
+            after=presence_flags(obj.checkin_at, obj.checkout_at),
+            checkin_changed=is_new or prev_in != obj.checkin_at,
+        ))
+    return out
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_attendances(session: Session, _flush_context, _instances) -> None:
+    # session.delete() de um objeto expirado (ex.: após commit): carrega as colunas
+    # enquanto a linha existe; no after_flush já não daria para lê-las
+    for obj in session.deleted:
+        if isinstance(obj, Attendance) and inspect(obj).unloaded:
+            session.refresh(obj)
+
+@event.listens_for(Session, "after_flush")
+def _capture_attendance_changes(session: Session, _flush_context) -> None:
+    # o estado "antes do flush" (new/dirty + histórico) ainda está disponível aqui
+    changes = _changes_in_flush(session)
+    if changes:
+        # contadores na mesma transação da gravação das presenças
+        apply_counter_deltas(session.connection(), changes)
+        session.info.setdefault("attendance_changes", []).extend(changes)
+
+@event.listens_for(Session, "after_commit")
+def _publish_attendance_changes(session: Session) -> None:
+    changes = session.info.pop("attendance_changes", None)
+    if changes:
+        broker.publish_changes(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_attendance_changes(session: Session) -> None:
+    session.info.pop("attendance_changes", None)
+
+# ------------------------ broker (SSE) ------------------------
+
+class OccupancyBroker:
+    """
+    Pub/sub em processo por day_event_id. Publicação thread-safe (vem do
+    commit, em threads do pool/flusher); cada assinante é uma asyncio.Queue
+    no loop do servidor. Mantém contadores correntes enquanto houver assinantes.
+    """
+
+    QUEUE_SIZE = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._counts: Dict[int, List[int]] = {}
+
+    def subscribe(self, day_event_id: int, snapshot: Dict[str, int]) -> asyncio.Queue:
+        """Chamar dentro do loop. `snapshot` inicializa os contadores se for o 1º assinante."""
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        with self._lock:
+            self._subs.setdefault(day_event_id, set()).add((asyncio.get_running_loop(), q))
+            self._counts.setdefault(day_event_id, [snapshot[k] for k in COUNTER_NAMES])
+        return q
+
+    def unsubscribe(self, day_event_id: int, q: asyncio.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(day_event_id, set())
+            subs.difference_update({s for s in subs if s[1] is q})
+            if not subs:
+                self._subs.pop(day_event_id, None)
+                self._counts.pop(day_event_id, None)
+
+    def reset_counts(self, day_event_id: int, counts: Dict[str, int]) -> None:
+        with self._lock:
+            if day_event_id in self._counts:
+                self._counts[day_event_id] = [counts[k] for k in COUNTER_NAMES]
+
+    def counts(self, day_event_id: int) -> Optional[Dict[str, int]]:
+        with self._lock:
+            c = self._counts.get(day_event_id)
+            return dict(zip(COUNTER_NAMES, c)) if c else None
+
+    def publish_changes(self, changes: List[AttendanceChange]) -> None:
+        with self._lock:
+            if not self._subs:
+                return
+            deliveries = []
+            for ch in changes:
+                subs = self._subs.get(ch.day_event_id)
+                if not subs:
+                    continue
+                counts = self._counts[ch.day_event_id]
+                for i, d in enumerate(ch.delta):
+                    counts[i] += d
+                msg = {
+                    "type": "delete" if ch.deleted else "checkin" if ch.checkin_changed else "checkout",
+                    "day_event_id": ch.day_event_id,
+                    "enrollment_id": ch.enrollment_id,
+                    "checkin_at": ch.checkin_at.isoformat() if ch.checkin_at else None,
+                    "checkout_at": ch.checkout_at.isoformat() if ch.checkout_at else None,
+                    "delta": dict(zip(COUNTER_NAMES, ch.delta)),
+                    "counts": dict(zip(COUNTER_NAMES, counts)),
+                }
+                deliveries.extend((loop, q, msg) for loop, q in subs)
+        for loop, q, msg in deliveries:
+            loop.call_soon_threadsafe(_offer, q, msg)
+
+def _offer(q: asyncio.Queue, msg: dict) -> None:
+    try:
+        q.put_nowait(msg)
+    except asyncio.QueueFull:
+        # dashboard lento: descarta o atraso e pede ressincronização
+        while not q.empty():
+            q.get_nowait()
+        q.put_nowait({"type": "resync"})
+
+broker = OccupancyBroker()
+
+if __name__ == "__main__":
+    # job de reconciliação: python -m app.services.occupancy [day_event_id ...]
+    import sys
+    from app.db.session import SessionLocal
+
+    with SessionLocal() as _db:
+        _ids = [int(a) for a in sys.argv[1:]] or None
+        print(f"day_event_counters reconciliados: {reconcile_counters(_db, _ids)}")
@@ -0,0 +1,37 @@
+# app/services/projection.py
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import InstrumentedAttribute
+
+# nome exposto na resposta -> atributo mapeado (ex.: "student_name" -> Student.name)
+Catalog = Mapping[str, InstrumentedAttribute]
+
+def parse_fields(raw: Optional[str], catalog: Catalog) -> Optional[List[str]]:
+    """
+    `fields=a,b,c` -> lista ordenada e sem repetição; None se não informado.
+    ValueError para campos fora do catálogo.
+    """
+    if raw is None or not raw.strip():
+        return None
+    names = list(dict.fromkeys(p.strip() for p in raw.split(",") if p.strip()))
+    unknown = [n for n in names if n not in catalog]
+    if unknown:
+        raise ValueError(
+            f"Campos desconhecidos: {', '.join(unknown)}. Disponíveis: {', '.join(catalog)}"
+        )
+    return names
+
+def entities(catalog: Catalog, names: Iterable[str]) -> Set[type]:
+    """Classes mapeadas tocadas pelos campos pedidos (decide quais JOINs montar)."""
+    return {catalog[n].class_ for n in names}
+
+def projected_select(catalog: Catalog, names: Iterable[str]):
+    """SELECT só das colunas pedidas, rotuladas com o nome de saída."""
+    return select(*(catalog[n].label(n) for n in names))
+
+def rows_to_dicts(rows: Iterable[Any], names: List[str]) -> List[Dict[str, Any]]:
+    # colunas extras no fim da linha (ex.: id do keyset) ficam de fora do zip
+    return [dict(zip(names, row)) for row in rows]
@@ -1,18 +1,163 @@
-import hmac, hashlib, time
+import base64, hmac, hashlib, io, threading, time
+from typing import Dict, List, Optional
+
+import qrcode  # type: ignore
+from qrcode.constants import ERROR_CORRECT_M  # type: ignore
+
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.services.roster import Roster
 
-def build_qr_token(qr_seed: str) -> str:
-    # nonce rotativo por janela de N segundos
-    window = int(time.time() // settings.QR_ROTATION_SECONDS)
+def current_window(now: Optional[float] = None) -> int:
+    return int((time.time() if now is None else now) // settings.QR_ROTATION_SECONDS)
+
+def token_for_window(qr_seed: str, window: int) -> str:
     msg = f"{qr_seed}:{window}".encode()
     return hmac.new(key=qr_seed.encode(), msg=msg, digestmod=hashlib.sha256).hexdigest()[:32]
 
+def build_qr_token(qr_seed: str) -> str:
+    # nonce rotativo por janela de N segundos
+    return token_for_window(qr_seed, current_window())
+
 def validate_qr_token(qr_seed: str, token: str, skew_windows: int = 1) -> bool:
     # tolerância de clock skew: ±1 janela
-    current = int(time.time() // settings.QR_ROTATION_SECONDS)
+    current = current_window()
     for w in (current-1, current, current+1)[: 2*skew_windows+1]:
-        msg = f"{qr_seed}:{w}".encode()
-        expected = hmac.new(qr_seed.encode(), msg, hashlib.sha256).hexdigest()[:32]
-        if hmac.compare_digest(expected, token):
+        if hmac.compare_digest(token_for_window(qr_seed, w), token):
             return True
     return False
+
+# ------------------ índice token -> inscrição por DayEvent ------------------
+
+class _TokenIndex:
+    """Tokens das janelas anterior/atual/próxima de todas as inscrições de um roster."""
+
+    def __init__(self, roster: Roster):
+        self.roster = roster
+        self.windows: Dict[int, Dict[str, int]] = {}
+
+    def advance(self, current: int) -> None:
+        # ao virar a janela só a "próxima" é calculada; a mais antiga sai
+        wanted = (current - 1, current, current + 1)
+        for w in list(self.windows):
+            if w not in wanted:
+                del self.windows[w]
+        seeds = self.roster.seeds
+        for w in wanted:
+            if w not in self.windows:
+                self.windows[w] = {token_for_window(seed, w): enr_id for enr_id, seed in seeds.items()}
+
+    def lookup(self, token: str, current: int) -> Optional[int]:
+        for w in (current, current - 1, current + 1):
+            enr_id = self.windows.get(w, {}).get(token)
+            if enr_id is not None:
+                return enr_id
+        return None
+
+_indexes: TTLCache[int, _TokenIndex] = TTLCache(ttl_seconds=3600, maxsize=64)
+# um lock por DayEvent: montar o índice de um evento grande (milhares de HMACs)
+# não trava os scans dos outros dias. _index_lock só protege a tabela de locks.
+# Dict simples (sem expiração): um lock não pode sumir enquanto alguém o segura,
+# senão dois threads montariam o mesmo índice; são poucos bytes por dia.
+_day_locks: Dict[int, threading.Lock] = {}
+_index_lock = threading.Lock()
+
+def _day_lock(day_event_id: int) -> threading.Lock:
+    with _index_lock:
+        return _day_locks.setdefault(day_event_id, threading.Lock())
+
+def resolve_qr_token(roster: Roster, token: str, now: Optional[float] = None) -> Optional[int]:
+    """
+    Token rotativo -> enrollment_id do roster, em O(1) (±1 janela de tolerância).
+    O índice é reconstruído quando o roster muda e avança com a janela.
+    """
+    current = current_window(now)
+    with _day_lock(roster.day_event_id):
+        idx = _indexes.get(roster.day_event_id)
+        if idx is None or (idx.roster is not roster and idx.roster.seeds != roster.seeds):
+            idx = _TokenIndex(roster)
+            _indexes.set(roster.day_event_id, idx)
+        else:
+            idx.roster = roster  # roster recarregado com as mesmas sementes: índice continua válido
+        if current not in idx.windows or (current + 1) not in idx.windows:
+            idx.advance(current)
+        return idx.lookup(token, current)
+
+# ------------------ imagem do QR (certificado, ingresso, inscrição) ------------------
+
+# QR por conteúdo: o mesmo texto sempre gera a mesma imagem
+_svgs: TTLCache[tuple, str] = TTLCache(ttl_seconds=3600, maxsize=2048)
+_pngs: TTLCache[tuple, str] = TTLCache(ttl_seconds=3600, maxsize=2048)
+
+# máscara fixa: a escolha automática testa as 8 e custa ~4x o resto da geração;
+# qualquer máscara é válida pela norma e lida normalmente pelos leitores
+QR_MASK_PATTERN = 0
+
+# zona de silêncio exigida pela norma (ISO/IEC 18004): 4 módulos claros em volta;
+# com menos, leitores de portaria falham sobre fundos carregados
+QR_QUIET_ZONE = 4
+
+def qr_matrix(text: str) -> List[List[bool]]:
+    """Módulos do QR (True = escuro), sem borda."""
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=0, mask_pattern=QR_MASK_PATTERN)
+    qr.add_data(text)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+def qr_svg(text: str, *, module: int = 4, border: int = QR_QUIET_ZONE) -> str:
+    """QR como SVG inline: um único <path> com as sequências escuras de cada linha."""
+    key = (text, module, border)
+    cached = _svgs.get(key)
+    if cached is not None:
+        return cached
+    matrix = qr_matrix(text)
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        n = len(row)
+        while x < n:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < n and row[x]:
+                x += 1
+            parts.append(f"M{start + border} {y + border}h{x - start}v1h-{x - start}z")
+    size = len(matrix) + 2 * border
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * module}" height="{size * module}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        f'<path fill="#000" d="{"".join(parts)}"/></svg>'
+    )
+    _svgs.set(key, svg)
+    return svg
+
+def qr_png(text: str, *, module: int = 4, border: int = QR_QUIET_ZONE) -> bytes:
+    """PNG 1-bit pequeno: matriz desenhada em 1px/módulo e ampliada sem interpolação."""
+    from PIL import Image  # Pillow já vem com qrcode[pil]
+
+    matrix = qr_matrix(text)
+    n = len(matrix)
+    size = n + 2 * border
+    pad = [1] * border
+    quiet = [1] * (size * border)  # linhas de borda em cima e embaixo
+    pixels = list(quiet)
+    for row in matrix:
+        pixels += pad + [0 if dark else 1 for dark in row] + pad
+    pixels += quiet
+    img = Image.new("1", (size, size))
+    img.putdata(pixels)
+    if module > 1:
+        img = img.resize((size * module, size * module), Image.NEAREST)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=False)
+    return buf.getvalue()
+
+def qr_png_data_uri(text: str, *, module: int = 4, border: int = QR_QUIET_ZONE) -> str:
+    key = (text, module, border)
+    cached = _pngs.get(key)
+    if cached is None:
+        cached = "data:image/png;base64," + base64.b64encode(qr_png(text, module=module, border=border)).decode("ascii")
+        _pngs.set(key, cached)
+    return cached
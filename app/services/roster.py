@@ -0,0 +1,63 @@
+# app/services/roster.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import FrozenSet, Mapping, Optional
+
+from sqlalchemy import String, and_, cast, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.day_event import DayEvent
+from app.models.event import Event
+from app.models.enrollment import Enrollment, STATUS_CANCELED
+
+@dataclass(frozen=True)
+class Roster:
+    """Quem pode entrar num DayEvent: inscrições ativas do evento + tenant dono."""
+    day_event_id: int
+    event_id: int
+    client_id: int
+    enrollment_ids: FrozenSet[int]
+    seeds: Mapping[int, str]  # enrollment_id -> qr_seed (índice do QR rotativo)
+
+_rosters: TTLCache[int, Roster] = TTLCache(settings.ROSTER_CACHE_TTL_SECONDS, maxsize=512)
+
+def load_roster(db: Session, day_event_id: int) -> Optional[Roster]:
+    """Uma consulta: dia -> evento (tenant) -> inscrições não canceladas."""
+    rows = db.execute(
+        select(DayEvent.event_id, Event.client_id, Enrollment.id, Enrollment.qr_seed)
+        .join(Event, Event.id == DayEvent.event_id)
+        .outerjoin(
+            Enrollment,
+            and_(
+                Enrollment.event_id == DayEvent.event_id,
+                # como texto: no Postgres o enum não tem "canceled" e o literal seria recusado
+                cast(Enrollment.status, String).notin_(STATUS_CANCELED),
+            ),
+        )
+        .where(DayEvent.id == day_event_id)
+    ).all()
+    if not rows:
+        return None
+    event_id, client_id = rows[0][0], rows[0][1]
+    seeds = {r[2]: r[3] for r in rows if r[2] is not None}
+    return Roster(
+        day_event_id=day_event_id,
+        event_id=event_id,
+        client_id=client_id,
+        enrollment_ids=frozenset(seeds),
+        seeds=seeds,
+    )
+
+def get_roster(db: Session, day_event_id: int) -> Optional[Roster]:
+    return _rosters.get_or_load(day_event_id, lambda: load_roster(db, day_event_id))
+
+# ---- invalidação (chamar após o commit que altera inscrições/dias) ----
+
+def invalidate_day(day_event_id: int) -> None:
+    _rosters.pop(day_event_id)
+
+def invalidate_event(event_id: int) -> None:
+    _rosters.pop_where(lambda _k, r: r.event_id == event_id)
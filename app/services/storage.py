@@ -0,0 +1,165 @@
+# app/services/storage.py
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from app.core.config import settings
+
+# S3 é opcional (boto3 só é exigido com CERT_STORAGE_BACKEND=s3)
+try:
+    import boto3  # type: ignore
+    from botocore.exceptions import ClientError  # type: ignore
+    _HAS_BOTO3 = True
+except Exception:
+    _HAS_BOTO3 = False
+
+CHUNK_SIZE = 64 * 1024
+
+@dataclass(frozen=True)
+class StoredObject:
+    size: int
+    etag: str  # já entre aspas, pronto para o header ETag
+
+def shard_key(tenant_slug: str, code: str) -> str:
+    """<tenant>/<c0c1>/<c2c3>/<code>.pdf — milhares de arquivos por tenant sem diretório gigante."""
+    return f"{tenant_slug}/{code[:2]}/{code[2:4]}/{code}.pdf"
+
+class CertificateStorage(ABC):
+    """Onde ficam os PDFs dos certificados, endereçados por (tenant, código)."""
+
+    @abstractmethod
+    def put(self, tenant_slug: str, code: str, data: bytes) -> str:
+        """Grava de forma atômica; devolve a chave/caminho."""
+
+    @abstractmethod
+    def stat(self, tenant_slug: str, code: str) -> Optional[StoredObject]:
+        """Tamanho e ETag, ou None se não existe."""
+
+    @abstractmethod
+    def iter_range(self, tenant_slug: str, code: str, start: int, end: int) -> Iterator[bytes]:
+        """Bytes [start, end] (inclusivo), em pedaços de até CHUNK_SIZE."""
+
+    def read(self, tenant_slug: str, code: str) -> bytes:
+        st = self.stat(tenant_slug, code)
+        if st is None:
+            raise FileNotFoundError(code)
+        return b"".join(self.iter_range(tenant_slug, code, 0, st.size - 1)) if st.size else b""
+
+# ------------------------ disco local ------------------------
+
+class LocalStorage(CertificateStorage):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, tenant_slug: str, code: str) -> str:
+        return os.path.join(self.root, *shard_key(tenant_slug, code).split("/"))
+
+    def _existing(self, tenant_slug: str, code: str) -> Optional[str]:
+        path = self._path(tenant_slug, code)
+        if os.path.exists(path):
+            return path
+        # layout antigo: <tenant>/<code>.pdf, sem shard
+        legacy = os.path.join(self.root, tenant_slug, f"{code}.pdf")
+        return legacy if os.path.exists(legacy) else None
+
+    def put(self, tenant_slug: str, code: str, data: bytes) -> str:
+        path = self._path(tenant_slug, code)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # temp no mesmo diretório + os.replace: quem lê nunca vê PDF pela metade
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{code}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return path
+
+    def stat(self, tenant_slug: str, code: str) -> Optional[StoredObject]:
+        path = self._existing(tenant_slug, code)
+        if path is None:
+            return None
+        st = os.stat(path)
+        return StoredObject(size=st.st_size, etag=f'"{st.st_size:x}-{st.st_mtime_ns:x}"')
+
+    def iter_range(self, tenant_slug: str, code: str, start: int, end: int) -> Iterator[bytes]:
+        path = self._existing(tenant_slug, code)
+        if path is None:
+            raise FileNotFoundError(code)
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+# ------------------------ S3 / compatível (MinIO etc.) ------------------------
+
+class S3Storage(CertificateStorage):
+    def __init__(self, bucket: str, *, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None):
+        if not _HAS_BOTO3:
+            raise RuntimeError("CERT_STORAGE_BACKEND=s3 requer o pacote boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        # credenciais pela cadeia padrão do boto3 (env, profile, role)
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+
+    def _key(self, tenant_slug: str, code: str) -> str:
+        return self.prefix + shard_key(tenant_slug, code)
+
+    def put(self, tenant_slug: str, code: str, data: bytes) -> str:
+        # PUT de objeto é atômico no S3: ou o objeto inteiro, ou nada
+        key = self._key(tenant_slug, code)
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType="application/pdf")
+        return key
+
+    def stat(self, tenant_slug: str, code: str) -> Optional[StoredObject]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(tenant_slug, code))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+        return StoredObject(size=int(head["ContentLength"]), etag=head["ETag"])
+
+    def iter_range(self, tenant_slug: str, code: str, start: int, end: int) -> Iterator[bytes]:
+        obj = self.client.get_object(
+            Bucket=self.bucket, Key=self._key(tenant_slug, code), Range=f"bytes={start}-{end}",
+        )
+        yield from obj["Body"].iter_chunks(CHUNK_SIZE)
+
+# ------------------------ instância configurada ------------------------
+
+_storage: Optional[CertificateStorage] = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> CertificateStorage:
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if settings.CERT_STORAGE_BACKEND == "s3":
+                _storage = S3Storage(
+                    settings.CERT_S3_BUCKET,
+                    prefix=settings.CERT_S3_PREFIX,
+                    endpoint_url=settings.CERT_S3_ENDPOINT_URL,
+                    region=settings.CERT_S3_REGION,
+                )
+            else:
+                _storage = LocalStorage(os.path.join(settings.DATA_DIR, "public", "certificates"))
+        return _storage
@@ -0,0 +1,58 @@
+# app/services/tenants.py
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import MultipleResultsFound
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.client import Client
+
+@dataclass(frozen=True)
+class TenantSnapshot:
+    """O que as rotas usam do Client do tenant; sem sessão, pode ser compartilhado entre requisições."""
+    id: int
+    slug: str
+    name: str
+    logo_url: Optional[str]
+    certificate_template_html: Optional[str]
+    default_min_presence_pct: Optional[int]
+    config_json: Dict[str, Any]
+
+_tenants: TTLCache[str, TenantSnapshot] = TTLCache(settings.TENANT_CACHE_TTL_SECONDS, maxsize=1024)
+
+def load_tenant(db: Session, slug: str) -> Optional[TenantSnapshot]:
+    # tolerante a duplicados de slug (pega o de maior id)
+    stmt = select(Client).where(Client.slug == slug)
+    try:
+        c = db.execute(stmt).scalar_one_or_none()
+    except MultipleResultsFound:
+        c = db.scalars(stmt.order_by(Client.id.desc()).limit(1)).first()
+    if c is None:
+        return None
+    return TenantSnapshot(
+        id=c.id,
+        slug=c.slug,
+        name=c.name,
+        logo_url=c.logo_url,
+        certificate_template_html=c.certificate_template_html,
+        default_min_presence_pct=c.default_min_presence_pct,
+        config_json=copy.deepcopy(c.config_json or {}),
+    )
+
+def get_tenant_snapshot(db: Session, slug: str) -> Optional[TenantSnapshot]:
+    # slug inexistente não é cacheado: slugs inventados não expulsam os verdadeiros
+    return _tenants.get_or_load(slug, lambda: load_tenant(db, slug))
+
+# ---- invalidação (chamar após o commit que cria/altera o client) ----
+
+def invalidate_tenant(client_id: int) -> None:
+    _tenants.pop_where(lambda _k, t: t.id == client_id)
+
+def invalidate_slug(slug: str) -> None:
+    _tenants.pop(slug)
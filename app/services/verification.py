@@ -0,0 +1,103 @@
+# app/services/verification.py
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.certificate import Certificate, CertificateStatus
+from app.models.client import Client
+from app.models.enrollment import Enrollment
+from app.models.event import Event
+from app.models.student import Student
+from app.services.verify_codes import check_code
+
+@dataclass(frozen=True)
+class Verification:
+    """Resposta pública de /verify/{code}, pronta para servir (None = não encontrado/revogado)."""
+    payload: Optional[dict]
+    etag: str
+
+_verifications: TTLCache[str, Verification] = TTLCache(settings.VERIFY_CACHE_TTL_SECONDS, maxsize=10_000)
+# "não encontrado" à parte, curto e pequeno: não disputa espaço com os certificados
+# verdadeiros e um código recém-emitido em outro worker aparece logo
+_not_found: TTLCache[str, bool] = TTLCache(settings.VERIFY_NOT_FOUND_TTL_SECONDS, maxsize=2_000)
+
+def _etag(payload: Optional[dict]) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+
+def load_verification(db: Session, code: str) -> Verification:
+    """Uma consulta: certificado -> inscrição -> aluno/evento -> cliente."""
+    row = db.execute(
+        select(
+            Certificate.status, Certificate.verify_code, Certificate.issued_at, Certificate.pdf_url,
+            Event.id, Event.title, Student.name, Client.name, Client.slug,
+        )
+        .join(Enrollment, Enrollment.id == Certificate.enrollment_id)
+        .join(Event, Event.id == Enrollment.event_id)
+        .join(Student, Student.id == Enrollment.student_id)
+        .join(Client, Client.id == Event.client_id)
+        .where(Certificate.verify_code == code)
+    ).first()
+    payload = None
+    if row is not None and row[0] == CertificateStatus.issued:
+        status, verify_code, issued_at, pdf_url, ev_id, ev_title, st_name, cli_name, cli_slug = row
+        # resposta “LGPD-friendly”
+        payload = jsonable_encoder({
+            "status": getattr(status, "value", status),
+            "verify_code": verify_code,
+            "issued_at": issued_at,
+            "client": {"name": cli_name, "slug": cli_slug},
+            "event": {"title": ev_title, "id": ev_id},
+            "student": {"name": st_name},
+            "pdf_url": pdf_url,
+        })
+    return Verification(payload=payload, etag=_etag(payload))
+
+_NOT_FOUND = Verification(payload=None, etag=_etag(None))
+
+def get_verification(db: Session, code: str) -> Verification:
+    """Do cache (inclusive "não encontrado") ou do banco; código forjado nem chega a nenhum dos dois."""
+    if not check_code(code):
+        # fora do cache de propósito: uma enxurrada de códigos inventados expulsaria os verdadeiros
+        return _NOT_FOUND
+    v = _verifications.get(code)
+    if v is not None:
+        return v
+    if _not_found.get(code):
+        return _NOT_FOUND
+    v = load_verification(db, code)
+    if v.payload is None:
+        _not_found.set(code, True)
+        return _NOT_FOUND
+    _verifications.set(code, v)
+    return v
+
+def invalidate_codes(codes: Iterable[str]) -> None:
+    for code in codes:
+        _verifications.pop(code)
+        _not_found.pop(code)
+
+# ---- invalidação no commit de emissão/revogação ----
+
+def mark_changed(db: Session, codes: Iterable[str]) -> None:
+    """Registra códigos alterados na transação; saem do cache quando ela confirmar."""
+    db.info.setdefault("verify_codes_changed", set()).update(codes)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    codes = session.info.pop("verify_codes_changed", None)
+    if codes:
+        invalidate_codes(codes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed(session: Session) -> None:
+    session.info.pop("verify_codes_changed", None)
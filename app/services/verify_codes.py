@@ -0,0 +1,184 @@
+# app/services/verify_codes.py
+#
+# Códigos de verificação de certificado sem consulta prévia: cada código é a
+# permutação (Feistel com chave derivada de SECRET_KEY) de um número de uma
+# sequência no banco. A permutação é bijetiva, então números distintos dão
+# códigos distintos e não há SELECT por código nem disputa no índice único.
+# Por fora o código continua parecendo aleatório (10 chars base32, como antes).
+#
+# Aos 10 chars soma-se um MAC curto (HMAC, 4 chars): um código inventado ou
+# digitado errado é recusado em memória, sem consulta nem entrada no cache da
+# verificação. Códigos antigos (10 chars, sem MAC) formam um conjunto fechado —
+# nenhum é emitido desde o MAC —, carregado uma vez por processo: só os que
+# estão nele vão ao banco (desligável com VERIFY_LEGACY_CODES=0).
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.certificate import Certificate
+from app.models.id_sequence import IdSequence
+
+log = logging.getLogger(__name__)
+
+SEQUENCE_NAME = "verify_code"
+CODE_CHARS = 10
+MAC_CHARS = 4                        # 20 bits: 1 em ~1 milhão de chutes passa para o banco
+_BITS = 5 * CODE_CHARS               # 50 bits -> 10 chars base32
+_HALF = _BITS // 2
+_HALF_MASK = (1 << _HALF) - 1
+_ROUNDS = 4
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz234567"  # base32 (RFC 4648) minúsculo
+
+# números reservados por ida ao banco quando o processo fica sem códigos
+BLOCK_SIZE = 64
+
+def _secret() -> bytes:
+    return (settings.VERIFY_CODE_SECRET or settings.SECRET_KEY).encode()
+
+def _key() -> bytes:
+    return hmac.new(_secret(), b"certificate-verify-code", hashlib.sha256).digest()
+
+def _mac_key() -> bytes:
+    return hmac.new(_secret(), b"certificate-verify-mac", hashlib.sha256).digest()
+
+def _round(key: bytes, i: int, half: int) -> int:
+    d = hmac.new(key, bytes([i]) + half.to_bytes(4, "big"), hashlib.sha256).digest()
+    return int.from_bytes(d[:4], "big") & _HALF_MASK
+
+def permute(n: int, key: bytes | None = None) -> int:
+    """Bijeção em [0, 2**50): mesmo n e chave -> mesmo resultado; n distintos -> distintos."""
+    key = key or _key()
+    left, right = n >> _HALF, n & _HALF_MASK
+    for i in range(_ROUNDS):
+        left, right = right, left ^ _round(key, i, right)
+    return (left << _HALF) | right
+
+def encode(value: int) -> str:
+    return "".join(_ALPHABET[(value >> (5 * i)) & 31] for i in reversed(range(CODE_CHARS)))
+
+def _mac(body: str, key: bytes) -> str:
+    d = int.from_bytes(hmac.new(key, body.encode("ascii"), hashlib.sha256).digest()[:4], "big")
+    return "".join(_ALPHABET[(d >> (5 * i)) & 31] for i in range(MAC_CHARS))
+
+def sign(body: str, key: bytes | None = None) -> str:
+    return body + _mac(body, key or _mac_key())
+
+def _base32(code: str) -> bool:
+    return all(c in _ALPHABET for c in code)
+
+def is_legacy_code(code: str) -> bool:
+    """Formato anterior ao MAC: 10 chars base32."""
+    return len(code) == CODE_CHARS and _base32(code)
+
+def decode(code: str) -> int:
+    value = 0
+    for c in code:
+        value = (value << 5) | _ALPHABET.index(c)
+    return value
+
+# ------------------------ códigos legados (conjunto fechado) ------------------------
+
+_legacy: Optional[array] = None  # valores decodificados, ordenados: 8 bytes por código
+_legacy_lock = threading.Lock()
+
+def load_legacy_codes() -> int:
+    """Lê do banco os códigos de 10 chars já emitidos. Chamado na subida (ou no primeiro uso)."""
+    global _legacy
+    values = array("Q")
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(Certificate.verify_code)
+            .where(func.length(Certificate.verify_code) == CODE_CHARS)
+            .execution_options(yield_per=10_000)
+        ).scalars()
+        values.extend(decode(c) for c in rows if is_legacy_code(c))
+    ordered = array("Q", sorted(values))
+    with _legacy_lock:
+        _legacy = ordered
+    log.info("códigos de verificação legados carregados: %d", len(ordered))
+    return len(ordered)
+
+def _legacy_codes() -> array:
+    if _legacy is None:
+        load_legacy_codes()  # subida sem o startup (scripts, testes)
+    return _legacy
+
+def is_known_legacy_code(code: str) -> bool:
+    codes = _legacy_codes()
+    value = decode(code)
+    i = bisect_left(codes, value)
+    return i < len(codes) and codes[i] == value
+
+def check_code(code: str) -> bool:
+    """
+    False: o código certamente não foi emitido aqui (formato ou MAC inválido) —
+    não vale consultar o banco. True: assinado corretamente, ou legado aceito.
+    """
+    if is_legacy_code(code):
+        return settings.VERIFY_LEGACY_CODES and is_known_legacy_code(code)
+    if len(code) != CODE_CHARS + MAC_CHARS or not _base32(code):
+        return False
+    return hmac.compare_digest(_mac(code[:CODE_CHARS], _mac_key()), code[CODE_CHARS:])
+
+def _reserve(n: int) -> int:
+    """Reserva [start, start+n) numa transação curta, separada da emissão."""
+    t = IdSequence.__table__
+    with SessionLocal() as db:
+        for _ in range(2):
+            end = db.execute(
+                update(t).where(t.c.name == SEQUENCE_NAME)
+                .values(next_value=t.c.next_value + n)
+                .returning(t.c.next_value)
+            ).scalar_one_or_none()
+            if end is not None:
+                db.commit()
+                return end - n
+            # banco criado sem a migração que semeia a sequência
+            try:
+                db.execute(insert(t).values(name=SEQUENCE_NAME, next_value=1))
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        raise RuntimeError("não foi possível reservar códigos de verificação")
+
+class _Allocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def take(self, n: int) -> List[int]:
+        with self._lock:
+            out: List[int] = []
+            while len(out) < n:
+                if self._next >= self._end:
+                    want = max(BLOCK_SIZE, n - len(out))
+                    self._next = _reserve(want)
+                    self._end = self._next + want
+                k = min(n - len(out), self._end - self._next)
+                out.extend(range(self._next, self._next + k))
+                self._next += k
+            return out
+
+_allocator = _Allocator()
+
+def new_verify_codes(n: int) -> List[str]:
+    """N códigos únicos e assinados; no máximo uma ida ao banco (lote) e nenhuma consulta por código."""
+    if n <= 0:
+        return []
+    key, mac_key = _key(), _mac_key()
+    return [sign(encode(permute(i, key)), mac_key) for i in _allocator.take(n)]
+
+def new_verify_code() -> str:
+    return new_verify_codes(1)[0]
@@ -0,0 +1,70 @@
+# app/services/zip_stream.py
+#
+# ZIP montado enquanto é enviado: cada entrada é escrita pedaço a pedaço num
+# destino sem seek, e o que o zipfile produziu é devolvido logo em seguida.
+# Sem seek o zipfile usa "data descriptor" (CRC/tamanhos depois dos dados) e
+# ZIP64 quando precisa — o arquivo inteiro nunca fica em memória nem em disco.
+from __future__ import annotations
+
+import datetime as dt
+import re
+import unicodedata
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List
+
+@dataclass(frozen=True)
+class ZipEntry:
+    name: str
+    size: int
+    modified: dt.datetime
+    chunks: Callable[[], Iterable[bytes]]  # chamado só quando a entrada for escrita
+
+class _Sink:
+    """Destino só de escrita (sem tell/seek): acumula até o próximo drain()."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+def safe_name(text: str, default: str = "arquivo") -> str:
+    """'José da Silva' -> 'jose-da-silva' (ASCII, seguro em qualquer descompactador)."""
+    ascii_ = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", ascii_.lower()).strip("-")[:60] or default
+
+def _date_time(value: dt.datetime) -> tuple:
+    # formato DOS: não representa antes de 1980
+    return max(value, dt.datetime(1980, 1, 1, tzinfo=value.tzinfo)).timetuple()[:6]
+
+def stream_zip(entries: Iterable[ZipEntry]) -> Iterator[bytes]:
+    """Bytes do ZIP (STORED: PDF já é comprimido), entrada por entrada."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, date_time=_date_time(entry.modified))
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = entry.size  # decide ZIP64 na entrada antes de escrever
+            with zf.open(info, "w") as f:
+                for chunk in entry.chunks():
+                    f.write(chunk)
+                    out = sink.drain()
+                    if out:
+                        yield out
+            out = sink.drain()
+            if out:
+                yield out
+    # diretório central
+    out = sink.drain()
+    if out:
+        yield out
@@ -0,0 +1,347 @@
+"""
+Benchmark da renderização de certificados, etapa por etapa: QR
+(_qr_data_uri), template (build_certificate_html / build_certificate_overlay),
+PDF (_html_to_pdf_bytes com xhtml2pdf ou o fallback reportlab, ou
+render_overlay_pdf) e gravação em disco (LocalStorage.put). Renderiza N
+certificados distintos com templates de cliente realistas e reporta tempo por
+etapa (média/p50/p95), pico de memória (tracemalloc) e tamanho do PDF.
+Grava em benchmarks/results/*.json.
+
+    python -m benchmarks.certificate_rendering --n 100
+    python -m benchmarks.certificate_rendering --templates fundo,overlay --engine both
+    python -m benchmarks.certificate_rendering --baseline benchmarks/results/<arquivo>.json
+
+Cenários (--templates):
+  padrao   template embutido (cliente sem certificate_template_html)
+  moldura  paisagem, moldura, logo, tabela de assinaturas
+  fundo    moldura + imagem de fundo em página inteira
+  overlay  o mesmo fundo no modo "fundo + campos" (cert_overlay)
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import datetime as dt
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="cert-bench-"))
+
+from app.models import Client, Event, Student  # noqa: E402
+from app.services import certificates, qr  # noqa: E402
+from app.services.cert_overlay import CONFIG_KEY, render_overlay_pdf  # noqa: E402
+from app.services.storage import LocalStorage  # noqa: E402
+
+STAGES = ("qr", "template", "pdf", "disk")
+SCENARIOS = ("padrao", "moldura", "fundo", "overlay")
+VERIFY_BASE = "https://eventos.example.edu/verify"
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--n", type=int, default=50, help="certificados por cenário")
+    p.add_argument("--templates", default=",".join(SCENARIOS), help="cenários separados por vírgula")
+    p.add_argument("--engine", choices=("pisa", "reportlab", "both"), default="pisa",
+                   help="renderizador HTML->PDF (reportlab = fallback de texto puro)")
+    p.add_argument("--memory-samples", type=int, default=10,
+                   help="certificados medidos com tracemalloc (passada à parte: ele distorce os tempos)")
+    p.add_argument("--label", default="", help="rótulo livre gravado no resultado")
+    p.add_argument("--out", help="arquivo de resultado (default: benchmarks/results/certificate_rendering-<ts>.json)")
+    p.add_argument("--baseline", help="resultado anterior para comparação")
+    return p.parse_args(argv)
+
+# ------------------------ massa de dados ------------------------
+
+def _image_data_uri(width: int, height: int, fmt: str) -> str:
+    # imagem sintética com gradiente e faixas: comprime como uma arte real, não como cor sólida
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        shade = 255 - int(60 * y / height)
+        draw.line([(0, y), (width, y)], fill=(shade, shade - 10, 230))
+    for x in range(0, width, max(width // 24, 1)):
+        draw.line([(x, 0), (x + height // 2, height)], fill=(200, 170, 90), width=3)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=85)
+    mime = "jpeg" if fmt == "JPEG" else fmt.lower()
+    return f"data:image/{mime};base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+_FRAME = """
+<!doctype html>
+<html>
+<head>
+<style>
+  @page { size: a4 landscape; margin: 1.2cm; %(page_bg)s }
+  body { font-family: Helvetica, Arial, sans-serif; color: #1f2a44; }
+  .frame { border: 6px double #b08d3c; padding: 24px 40px; }
+  h1 { font-size: 38px; letter-spacing: 4px; text-align: center; margin: 6px 0 2px 0; }
+  .sub { text-align: center; font-size: 13px; color: #6b7280; }
+  .texto { font-size: 17px; line-height: 1.5; text-align: justify; margin-top: 18px; }
+  .nome { font-size: 26px; font-weight: bold; }
+  table.ass { width: 100%%; margin-top: 36px; }
+  table.ass td { text-align: center; font-size: 12px; border-top: 1px solid #1f2a44; padding-top: 4px; }
+  .rodape { font-size: 10px; color: #4b5563; }
+</style>
+</head>
+<body>
+<div class="frame">
+  <div style="text-align:center">{%% if client.logo_url %%}<img src="{{ client.logo_url }}" style="height:64px">{%% endif %%}</div>
+  <h1>CERTIFICADO</h1>
+  <div class="sub">{{ client.nome }}</div>
+  <div class="texto">
+    Certificamos que <span class="nome">{{ aluno.nome }}</span>, CPF {{ aluno.cpf_mask }},
+    participou do evento <b>{{ evento.titulo }}</b>, realizado de {{ evento.inicio }} a
+    {{ evento.fim }}, com carga horária de {{ carga_horas }} horas e
+    {{ stats.pct|round(1) }}%% de presença (mínimo exigido: {{ required_pct }}%%).
+  </div>
+  <table class="ass"><tr>
+    <td>Coordenação do evento</td><td style="width:12%%; border-top:none"></td><td>Direção acadêmica</td>
+  </tr></table>
+  <table style="width:100%%; margin-top:18px"><tr>
+    <td class="rodape">Emitido em {{ emissao }}<br>Código de verificação: <b>{{ codigo }}</b><br>{{ verify_url }}</td>
+    <td style="text-align:right"><img src="{{ qr_data_uri }}" style="height:90px"></td>
+  </tr></table>
+</div>
+</body>
+</html>
+""".strip()
+
+_OVERLAY_BACKGROUND = """
+<!doctype html>
+<html>
+<head>
+<style>
+  @page { size: a4 landscape; margin: 1.2cm; %(page_bg)s }
+  body { font-family: Helvetica, Arial, sans-serif; color: #1f2a44; }
+  h1 { font-size: 38px; letter-spacing: 4px; text-align: center; margin-top: 50px; }
+  .sub { text-align: center; font-size: 13px; color: #6b7280; }
+</style>
+</head>
+<body>
+  <div style="text-align:center">{%% if client.logo_url %%}<img src="{{ client.logo_url }}" style="height:64px">{%% endif %%}</div>
+  <h1>CERTIFICADO</h1>
+  <div class="sub">{{ client.nome }} — {{ evento.titulo }} — {{ carga_horas }} horas</div>
+</body>
+</html>
+""".strip()
+
+_OVERLAY_FIELDS = {
+    "nome": {"x": 421, "y": 320, "size": 26, "font": "Helvetica-Bold", "align": "center"},
+    "horas": {"x": 421, "y": 280, "size": 14, "align": "center",
+              "text": "participou de {titulo} ({carga_horas} horas, {pct}% de presença)"},
+    "codigo": {"x": 60, "y": 40, "size": 9, "text": "Emitido em {emissao} — código {codigo} — {verify_url}"},
+    "qr": {"x": 700, "y": 30, "size": 90},
+}
+
+def _client(scenario: str) -> Client:
+    logo = _image_data_uri(240, 80, "PNG")
+    page_bg = ""
+    if scenario in ("fundo", "overlay"):
+        page_bg = "background-image: url(%s);" % _image_data_uri(1754, 1240, "JPEG")
+    client = Client(id=1, name="Instituto de Ensino Exemplo", cnpj="00000000000100", slug="bench",
+                    logo_url=logo, config_json={})
+    if scenario in ("moldura", "fundo"):
+        client.certificate_template_html = _FRAME % {"page_bg": page_bg}
+    if scenario == "overlay":
+        client.config_json = {CONFIG_KEY: {
+            "background_html": _OVERLAY_BACKGROUND % {"page_bg": page_bg},
+            "fields": _OVERLAY_FIELDS,
+        }}
+    return client
+
+def _event() -> Event:
+    start = dt.datetime(2026, 3, 9, 8, tzinfo=dt.timezone.utc)
+    return Event(id=1, client_id=1, title="Semana Acadêmica de Engenharia e Tecnologia",
+                 workload_hours=40, start_at=start, end_at=start + dt.timedelta(days=4))
+
+def _students(n: int) -> List[Student]:
+    first = ("Ana", "João", "Maria", "José", "Luíza", "Pedro", "Fernanda", "Gabriel")
+    last = ("da Silva Santos", "de Oliveira", "Pereira Lima", "Conceição Araújo", "Gonçalves")
+    return [
+        Student(id=i, client_id=1, name=f"{first[i % len(first)]} {last[i % len(last)]} {i}",
+                cpf=f"{i:011d}", email=f"aluno{i}@example.edu")
+        for i in range(1, n + 1)
+    ]
+
+# ------------------------ medição ------------------------
+
+def _render(client: Client, event: Event, student: Student, storage: LocalStorage,
+            timer: Callable[[str, Callable], object]) -> int:
+    """Um certificado completo; timer(etapa, fn) executa e mede cada etapa."""
+    code = f"B{student.id:09d}"
+    verify_url = f"{VERIFY_BASE}/{code}"
+    stats = certificates.PresenceStats(total_days=4, present_days=4, pct=100.0, minutes=0, minutes_total=0)
+    kwargs = dict(client=client, event=event, student=student, verify_url=verify_url,
+                  verify_code=code, stats=stats, required_pct=75)
+    spec = certificates.overlay_spec(client.config_json)
+    if spec is not None:
+        # QR desenhado dentro do PDF (vetorial): sem etapa própria
+        job = timer("template", lambda: certificates.build_certificate_overlay(spec=spec, **kwargs))
+        pdf = timer("pdf", lambda: render_overlay_pdf(job))
+    else:
+        # QR primeiro, sem cache: build_certificate_html o encontra pronto e mede só o template
+        qr._pngs.clear()
+        timer("qr", lambda: certificates._qr_data_uri(verify_url))
+        html = timer("template", lambda: certificates.build_certificate_html(**kwargs))
+        pdf = timer("pdf", lambda: certificates._html_to_pdf_bytes(html))
+    timer("disk", lambda: storage.put(client.slug, code, pdf))
+    return len(pdf)
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    v = sorted(values)
+    return {
+        "mean_ms": round(sum(v) / len(v) * 1000, 3),
+        "p50_ms": round(_percentile(v, 50) * 1000, 3),
+        "p95_ms": round(_percentile(v, 95) * 1000, 3),
+    }
+
+def _run_case(scenario: str, n: int, memory_samples: int) -> Dict:
+    client, event, students = _client(scenario), _event(), _students(n)
+    storage = LocalStorage(tempfile.mkdtemp(prefix="cert-bench-store-", dir=os.environ["DATA_DIR"]))
+    # aquecimento: template compilado e fundo do overlay em cache, como no
+    # segundo certificado em diante de uma emissão em lote
+    _render(client, event, _students(1)[0], storage, lambda _s, fn: fn())
+
+    times: Dict[str, List[float]] = {s: [] for s in STAGES}
+    totals: List[float] = []
+    sizes: List[int] = []
+
+    def timer(stage: str, fn):
+        t = time.perf_counter()
+        out = fn()
+        times[stage].append(time.perf_counter() - t)
+        return out
+
+    for st in students:
+        t = time.perf_counter()
+        sizes.append(_render(client, event, st, storage, timer))
+        totals.append(time.perf_counter() - t)
+
+    # pico de memória por certificado (por etapa e no total), em passada separada;
+    # o pico total é medido a partir da memória antes do certificado, não da etapa
+    peaks: Dict[str, int] = {s: 0 for s in STAGES}
+    peak_total = 0
+    cert_start = 0
+
+    def mem_timer(stage: str, fn):
+        nonlocal peak_total
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        out = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        peaks[stage] = max(peaks[stage], peak - before)
+        peak_total = max(peak_total, peak - cert_start)
+        return out
+
+    tracemalloc.start()
+    try:
+        for st in students[:memory_samples]:
+            cert_start = tracemalloc.get_traced_memory()[0]
+            _render(client, event, st, storage, mem_timer)
+    finally:
+        tracemalloc.stop()
+
+    stages = {s: _summary(v) for s, v in times.items() if v}
+    for s in stages:
+        stages[s]["peak_kib"] = round(peaks[s] / 1024, 1)
+    return {
+        "certificates": n,
+        "total": dict(_summary(totals), peak_kib=round(peak_total / 1024, 1)),
+        "stages": stages,
+        "pdf_bytes": {"mean": round(sum(sizes) / len(sizes)), "max": max(sizes)},
+    }
+
+# ------------------------ saída ------------------------
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def _print_case(name: str, r: Dict) -> None:
+    t = r["total"]
+    print(f"{name}: {r['certificates']} certificados | total {t['mean_ms']:.1f} ms/cert "
+          f"(p95 {t['p95_ms']:.1f}) | pico {t['peak_kib']:.0f} KiB | PDF {r['pdf_bytes']['mean']} bytes")
+    for stage, s in r["stages"].items():
+        print(f"  {stage:9s} {s['mean_ms']:9.3f} ms  p50 {s['p50_ms']:9.3f}  p95 {s['p95_ms']:9.3f}  "
+              f"pico {s['peak_kib']:8.1f} KiB")
+
+def _compare(result: Dict, baseline_path: str) -> None:
+    base = json.loads(Path(baseline_path).read_text())
+    print(f"comparação com {baseline_path} ({base.get('label') or base.get('git_rev')}):")
+    for name, new in result["results"].items():
+        old = base["results"].get(name)
+        if not old:
+            continue
+        for key, a, b in (
+            ("ms/cert", old["total"]["mean_ms"], new["total"]["mean_ms"]),
+            ("pico KiB", old["total"]["peak_kib"], new["total"]["peak_kib"]),
+            ("PDF bytes", old["pdf_bytes"]["mean"], new["pdf_bytes"]["mean"]),
+        ):
+            delta = (b - a) / a * 100 if a else 0.0
+            print(f"  {name:20s} {key:9s} {a:10.2f} -> {b:10.2f}  ({delta:+.1f}%)")
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    scenarios = [s.strip() for s in args.templates.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+    engines = ["pisa", "reportlab"] if args.engine == "both" else [args.engine]
+    if "pisa" in engines and not certificates._HAS_PISA:
+        raise SystemExit("xhtml2pdf não instalado: use --engine reportlab")
+
+    results: Dict[str, Dict] = {}
+    has_pisa = certificates._HAS_PISA
+    try:
+        for engine in engines:
+            certificates._HAS_PISA = has_pisa and engine == "pisa"
+            for scenario in scenarios:
+                if scenario == "overlay" and engine == "reportlab":
+                    continue  # o fundo do overlay precisa do HTML renderizado de verdade
+                name = f"{scenario}/{engine}"
+                results[name] = _run_case(scenario, args.n, min(args.memory_samples, args.n))
+                _print_case(name, results[name])
+    finally:
+        certificates._HAS_PISA = has_pisa
+
+    result = {
+        "benchmark": "certificate_rendering",
+        "label": args.label,
+        "git_rev": _git_rev(),
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "config": {"n": args.n, "templates": scenarios, "engines": engines,
+                   "memory_samples": args.memory_samples},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else (
+        RESULTS_DIR / f"certificate_rendering-{dt.datetime.now():%Y%m%d-%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"resultado: {out}")
+    if args.baseline:
+        _compare(result, args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,245 @@
+"""
+Benchmark de throughput da portaria (POST /{tenant}/gate/scan).
+
+Cria um banco descartável (SQLite temporário por padrão, ou --database-url
+para um Postgres de teste — as tabelas são criadas nele), popula um tenant
+grande (inscrições x dias) e dispara scans com N clientes concorrentes
+em processo (httpx + ASGITransport, sem rede). Grava throughput e
+percentis de latência em benchmarks/results/*.json.
+
+    python -m benchmarks.gate_throughput --enrollments 5000 --days 4 \
+        --concurrency 32 --requests 20000
+    python -m benchmarks.gate_throughput --write-behind --baseline benchmarks/results/<arquivo>.json
+
+Use sempre um banco dedicado: o script cria tabelas e insere dados.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+TENANT = "bench"
+PASSWORD = "bench-pass-123"
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--database-url", help="banco descartável (default: SQLite temporário)")
+    p.add_argument("--enrollments", type=int, default=5000)
+    p.add_argument("--days", type=int, default=4)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--requests", type=int, default=10000)
+    p.add_argument("--warmup", type=int, default=200)
+    p.add_argument("--checkout-ratio", type=float, default=0.3,
+                   help="fração dos scans que são checkout de um checkin anterior")
+    p.add_argument("--write-behind", action="store_true", help="liga GATE_WRITE_BEHIND")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--label", default="", help="rótulo livre gravado no resultado")
+    p.add_argument("--out", help="arquivo de resultado (default: benchmarks/results/gate_throughput-<ts>.json)")
+    p.add_argument("--baseline", help="resultado anterior para comparação")
+    return p.parse_args(argv)
+
+def _configure_env(args) -> str:
+    # precisa acontecer antes de importar app.* (settings/engine leem o ambiente no import)
+    if args.database_url:
+        url = args.database_url
+    else:
+        tmp = tempfile.mkdtemp(prefix="gate-bench-")
+        os.environ.setdefault("DATA_DIR", tmp)
+        url = f"sqlite:///{tmp}/bench.db"
+    os.environ["DATABASE_URL"] = url
+    os.environ["GATE_WRITE_BEHIND"] = "1" if args.write_behind else "0"
+    sys.path.insert(0, str(ROOT))
+    return url
+
+# ------------------------ massa de dados ------------------------
+
+def _seed(n_enrollments: int, n_days: int) -> Tuple[List[int], List[int]]:
+    from sqlalchemy import insert, select
+
+    import app.models  # noqa: F401 — registra todos os mapeamentos
+    from app.core.security import hash_password
+    from app.db.base import Base
+    from app.db.session import SessionLocal, engine
+    from app.models import Client, DayEvent, Enrollment, Event, Role, Student, User
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        role = db.execute(select(Role).where(Role.name == "portaria")).scalar_one_or_none()
+        if role is None:
+            role = Role(name="portaria")
+            db.add(role)
+        client = Client(name="Benchmark", cnpj="00000000000000", slug=TENANT, config_json={})
+        db.add(client)
+        db.flush()
+        user = User(client_id=client.id, name="Portaria", email=f"gate@{TENANT}.local",
+                    hashed_password=hash_password(PASSWORD), status="active")
+        user.roles.append(role)
+        ev = Event(client_id=client.id, title="Benchmark", workload_hours=8)
+        db.add_all([user, ev])
+        db.flush()
+        base = dt.date.today()
+        days = [DayEvent(event_id=ev.id, date=base + dt.timedelta(days=i),
+                         start_time=dt.time(8), end_time=dt.time(18)) for i in range(n_days)]
+        db.add_all(days)
+        db.flush()
+
+        # Core em lote: ordens de grandeza mais rápido que ORM linha a linha
+        db.execute(insert(Student), [
+            {"client_id": client.id, "name": f"Aluno {i}", "cpf": f"{i:011d}",
+             "email": f"aluno{i}@{TENANT}.local"}
+            for i in range(n_enrollments)
+        ])
+        student_ids = db.scalars(select(Student.id).where(Student.client_id == client.id)).all()
+        db.execute(insert(Enrollment), [
+            {"student_id": sid, "event_id": ev.id, "status": "confirmed", "qr_seed": f"seed-{sid}"}
+            for sid in student_ids
+        ])
+        enr_ids = db.scalars(select(Enrollment.id).where(Enrollment.event_id == ev.id)).all()
+        day_ids = [d.id for d in days]
+        db.commit()
+    return list(enr_ids), day_ids
+
+def _plan(enr_ids: List[int], day_ids: List[int], n: int, checkout_ratio: float,
+          rng: random.Random) -> List[dict]:
+    """Sequência de scans: checkins em pares (inscrição, dia) e checkouts de pares já vistos."""
+    pairs = [(e, d) for d in day_ids for e in enr_ids]
+    rng.shuffle(pairs)
+    plan: List[dict] = []
+    seen: List[Tuple[int, int]] = []
+    for i in range(n):
+        if seen and rng.random() < checkout_ratio:
+            e, d = seen[rng.randrange(len(seen))]
+            action = "checkout"
+        else:
+            e, d = pairs[i % len(pairs)]
+            seen.append((e, d))
+            action = "checkin"
+        plan.append({"enrollment_id": e, "day_event_id": d, "action": action})
+    return plan
+
+# ------------------------ carga ------------------------
+
+async def _drive(plan: List[dict], concurrency: int) -> Tuple[List[float], Counter, float]:
+    import httpx
+    from app.main import api
+
+    transport = httpx.ASGITransport(app=api)  # sem lifespan: não roda migrations/seed
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post(f"/api/v1/{TENANT}/auth/login",
+                              json={"username": f"gate@{TENANT}.local", "password": PASSWORD})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        url = f"/api/v1/{TENANT}/gate/scan"
+
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+        it = iter(plan)
+
+        async def worker():
+            for body in it:  # iterador compartilhado: cada scan é enviado uma vez
+                t0 = time.perf_counter()
+                resp = await client.post(url, json=body, headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                statuses[resp.status_code] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - t0
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _compare(result: Dict, baseline_path: str) -> None:
+    base = json.loads(Path(baseline_path).read_text())
+    print(f"\ncomparação com {baseline_path} ({base.get('git_rev')}):")
+    for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+        old, new = base["results"][key], result["results"][key]
+        delta = (new - old) / old * 100 if old else 0.0
+        print(f"  {key:15s} {old:10.2f} -> {new:10.2f}  ({delta:+.1f}%)")
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    url = _configure_env(args)
+    rng = random.Random(args.seed)
+
+    t = time.perf_counter()
+    enr_ids, day_ids = _seed(args.enrollments, args.days)
+    seed_s = time.perf_counter() - t
+    print(f"seed: {len(enr_ids)} inscrições x {len(day_ids)} dias em {seed_s:.1f}s")
+
+    plan = _plan(enr_ids, day_ids, args.warmup + args.requests, args.checkout_ratio, rng)
+    if args.warmup:
+        asyncio.run(_drive(plan[:args.warmup], args.concurrency))
+    latencies, statuses, elapsed = asyncio.run(_drive(plan[args.warmup:], args.concurrency))
+
+    if args.write_behind:
+        from app.services.gate_queue import write_behind
+        write_behind.stop()  # drena a fila: o tempo de gravação não entra na latência
+
+    lat = sorted(latencies)
+    result = {
+        "benchmark": "gate_throughput",
+        "label": args.label,
+        "git_rev": _git_rev(),
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "config": {
+            "database": url.split(":", 1)[0],
+            "enrollments": args.enrollments,
+            "days": args.days,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "checkout_ratio": args.checkout_ratio,
+            "write_behind": args.write_behind,
+            "seed": args.seed,
+        },
+        "results": {
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(_percentile(lat, 50) * 1000, 3),
+            "p95_ms": round(_percentile(lat, 95) * 1000, 3),
+            "p99_ms": round(_percentile(lat, 99) * 1000, 3),
+            "max_ms": round(lat[-1] * 1000, 3) if lat else 0.0,
+            "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        },
+    }
+
+    out = Path(args.out) if args.out else (
+        RESULTS_DIR / f"gate_throughput-{dt.datetime.now():%Y%m%d-%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+
+    r = result["results"]
+    print(f"{len(lat)} scans em {r['elapsed_s']}s: {r['throughput_rps']} req/s | "
+          f"p50 {r['p50_ms']}ms p95 {r['p95_ms']}ms p99 {r['p99_ms']}ms | status {r['status_codes']}")
+    print(f"resultado: {out}")
+    if args.baseline:
+        _compare(result, args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+"""
+Paridade e tempo dos motores do modo 'hours' (compute_presence_stats_bulk):
+laço em Python x NumPy vetorizado. Gera presenças sintéticas com os casos
+de borda (sem checkout, checkout antes do checkin, fora do horário do dia,
+frações de minuto, datetimes naive como o SQLite devolve) e exige resultado
+idêntico por inscrição. Sai com código 1 se houver divergência.
+
+    python -m benchmarks.presence_engine_parity --enrollments 2000 --days 30
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services import certificates as svc  # noqa: E402
+
+UTC = dt.timezone.utc
+
+def _bounds(n_days: int, rng: random.Random):
+    base = dt.date(2025, 3, 3)
+    out = {}
+    for i in range(n_days):
+        start = dt.time(rng.choice([7, 8, 9, 13]), rng.choice([0, 15, 30]))
+        end = dt.time(min(23, start.hour + rng.randint(1, 9)), rng.choice([0, 45]))
+        d = type("Day", (), {"date": base + dt.timedelta(days=i), "start_time": start, "end_time": end})
+        out[1000 + i] = svc._day_bounds(d)
+    return out
+
+def _rows(ids, bounds, rng: random.Random, density: float):
+    rows = []
+    for enr in ids:
+        for day_id, (start, end, _dur) in bounds.items():
+            if rng.random() > density:
+                continue
+            cin = start + dt.timedelta(seconds=rng.randint(-3 * 3600, 10 * 3600),
+                                       microseconds=rng.choice([0, 1, 999_999, rng.randint(0, 999_999)]))
+            r = rng.random()
+            if r < 0.25:
+                cout = None                                            # sem checkout: conta até o fim do dia
+            elif r < 0.35:
+                cout = cin - dt.timedelta(minutes=rng.randint(1, 120))  # re-entrada: checkout antes do checkin
+            else:
+                cout = cin + dt.timedelta(seconds=rng.randint(0, 12 * 3600), microseconds=rng.randint(0, 999_999))
+            if rng.random() < 0.5:                                     # SQLite: naive em UTC
+                cin = cin.replace(tzinfo=None)
+                cout = cout.replace(tzinfo=None) if cout else None
+            rows.append((enr, day_id, cin, cout))
+    # linha de inscrição fora do conjunto pedido deve ser ignorada pelos dois motores
+    rows.append((-1, next(iter(bounds)), next(iter(bounds.values()))[0], None))
+    rng.shuffle(rows)
+    return rows
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--enrollments", type=int, default=2000)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--density", type=float, default=0.8, help="fração de (inscrição, dia) com presença")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+
+    if not svc._HAS_NUMPY:
+        print("numpy não instalado: só o motor em Python está disponível")
+        return 1
+
+    rng = random.Random(args.seed)
+    ids = list(range(1, args.enrollments + 1))
+    bounds = _bounds(args.days, rng)
+    rows = _rows(ids, bounds, rng, args.density)
+    print(f"{len(rows)} presenças, {len(ids)} inscrições, {len(bounds)} dias")
+
+    timings = {}
+    results = {}
+    for name, engine in (("python", svc._hours_minutes_python), ("numpy", svc._hours_minutes_numpy)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            results[name] = engine(rows, bounds, ids)
+            best = min(best, time.perf_counter() - t)
+        timings[name] = best
+        print(f"  {name:7s} {best * 1000:9.1f} ms")
+
+    diff = [i for i in ids if results["python"][i] != results["numpy"][i]]
+    print(f"  speedup {timings['python'] / timings['numpy']:.1f}x")
+    if diff:
+        i = diff[0]
+        print(f"DIVERGÊNCIA em {len(diff)} inscrições (ex.: {i}: python={results['python'][i]} numpy={results['numpy'][i]})")
+        return 1
+    print("paridade OK")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark do QR por certificado: gerador antigo (qrcode.make, PNG
+RGB 10px/módulo + base64) x services/qr.py (PNG 1-bit 4px/módulo, SVG
+inline) e acerto de cache. Com --pdf mede também o xhtml2pdf com cada imagem,
+que é onde o PNG grande pesa.
+
+    python -m benchmarks.qr_generation --n 500 --pdf
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="qr-bench-"))
+
+import qrcode  # noqa: E402
+
+from app.services import qr  # noqa: E402
+
+def legacy_data_uri(text: str) -> str:
+    # implementação anterior de certificates._qr_data_uri
+    img = qrcode.make(text)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+def _time(fn, texts) -> tuple[float, int]:
+    t = time.perf_counter()
+    size = 0
+    for s in texts:
+        size = len(fn(s))
+    return (time.perf_counter() - t) / len(texts), size
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--n", type=int, default=300)
+    p.add_argument("--pdf", action="store_true", help="mede também a renderização do PDF")
+    args = p.parse_args(argv)
+
+    # URLs de verificação distintas, como numa emissão em lote
+    texts = [f"https://eventos.example.edu/verify/{i:010d}" for i in range(args.n)]
+    cases = [
+        ("legado png", legacy_data_uri),
+        ("png 1-bit", lambda s: qr._pngs.clear() or qr.qr_png_data_uri(s)),
+        ("svg inline", lambda s: qr._svgs.clear() or qr.qr_svg(s)),
+    ]
+    print(f"{args.n} QRs distintos (por certificado):")
+    base = None
+    for name, fn in cases:
+        per, size = _time(fn, texts)
+        base = base or per
+        print(f"  {name:12s} {per * 1e3:7.3f} ms  {size:6d} bytes  ({base / per:4.1f}x)")
+
+    qr.qr_png_data_uri(texts[0])
+    per, _ = _time(qr.qr_png_data_uri, [texts[0]] * args.n)
+    print(f"  {'cache (png)':12s} {per * 1e3:7.3f} ms")
+
+    if args.pdf:
+        from app.services.certificates import _html_to_pdf_bytes
+        html = '<html><body><p>Certificado</p><img src="{}" style="height:120px"></body></html>'
+        n = min(args.n, 50)
+        print(f"PDF com a imagem do QR ({n} certificados):")
+        for name, fn in (("legado png", legacy_data_uri), ("png 1-bit", qr.qr_png_data_uri)):
+            per, size = _time(lambda s: _html_to_pdf_bytes(html.format(fn(s))), texts[:n])
+            print(f"  {name:12s} {per * 1e3:7.1f} ms  {size:6d} bytes")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,25 @@
+"""certificate_jobs.runner_id/heartbeat_at: detecção de jobs órfãos
+
+Revision ID: 8b2e6c4d1f07
+Revises: 3d7f2a9c1e58
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "8b2e6c4d1f07"
+down_revision = "3d7f2a9c1e58"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('certificate_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('runner_id', sa.String(length=80), nullable=True))
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+        batch_op.create_index(batch_op.f('ix_certificate_jobs_heartbeat_at'), ['heartbeat_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('certificate_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_certificate_jobs_heartbeat_at'))
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('runner_id')
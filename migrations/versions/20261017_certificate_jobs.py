@@ -0,0 +1,46 @@
+"""certificate_jobs: emissão de certificados em lote (background)
+
+Revision ID: 7c1e5d8a2b90
+Revises: 3f6b2a9c1d47
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "7c1e5d8a2b90"
+down_revision = "3f6b2a9c1d47"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('certificate_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('mode', sa.String(length=10), nullable=False),
+    sa.Column('reissue', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.Enum('queued', 'running', 'done', 'failed', name='certificatejobstatus'), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('issued', sa.Integer(), nullable=False),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('results_json', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['client_id'], ['clients.id'], name=op.f('fk_certificate_jobs_client_id_clients')),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], name=op.f('fk_certificate_jobs_event_id_events'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_certificate_jobs_user_id_users')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_certificate_jobs'))
+    )
+    op.create_index(op.f('ix_certificate_jobs_client_id'), 'certificate_jobs', ['client_id'], unique=False)
+    op.create_index(op.f('ix_certificate_jobs_event_id'), 'certificate_jobs', ['event_id'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_certificate_jobs_event_id'), table_name='certificate_jobs')
+    op.drop_index(op.f('ix_certificate_jobs_client_id'), table_name='certificate_jobs')
+    op.drop_table('certificate_jobs')
+    sa.Enum(name='certificatejobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,21 @@
+"""certificates.render_json: dados para gerar o PDF sob demanda
+
+Revision ID: 3d7f2a9c1e58
+Revises: 5e8b1c3f7a24
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "3d7f2a9c1e58"
+down_revision = "5e8b1c3f7a24"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('certificates', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('render_json', sa.JSON(), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table('certificates', schema=None) as batch_op:
+        batch_op.drop_column('render_json')
@@ -0,0 +1,42 @@
+"""day_event_counters: contadores de presença por dia
+
+Revision ID: 3f6b2a9c1d47
+Revises: seedroles01a2b3
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "3f6b2a9c1d47"
+down_revision = "seedroles01a2b3"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('day_event_counters',
+    sa.Column('day_event_id', sa.Integer(), nullable=False),
+    sa.Column('checked_in', sa.Integer(), nullable=False),
+    sa.Column('checked_out', sa.Integer(), nullable=False),
+    sa.Column('inside', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['day_event_id'], ['day_events.id'], name=op.f('fk_day_event_counters_day_event_id_day_events'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day_event_id', name=op.f('pk_day_event_counters'))
+    )
+    # backfill a partir das presenças existentes (mesma regra de presence_flags)
+    op.execute("""
+        INSERT INTO day_event_counters (day_event_id, checked_in, checked_out, inside)
+        SELECT d.id,
+               COUNT(a.checkin_at),
+               COUNT(a.checkout_at),
+               COALESCE(SUM(CASE
+                   WHEN a.checkin_at IS NULL THEN 0
+                   WHEN a.checkout_at IS NULL THEN 1
+                   WHEN a.checkout_at < a.checkin_at THEN 1
+                   ELSE 0 END), 0)
+        FROM day_events d
+        LEFT JOIN attendances a ON a.day_event_id = d.id
+        GROUP BY d.id
+    """)
+
+def downgrade():
+    op.drop_table('day_event_counters')
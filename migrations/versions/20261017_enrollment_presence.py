@@ -0,0 +1,41 @@
+"""enrollment_presence: elegibilidade persistida por inscrição
+
+Revision ID: 5e8b1c3f7a24
+Revises: 9a4d2e6f0b13
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "5e8b1c3f7a24"
+down_revision = "9a4d2e6f0b13"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('enrollment_presence',
+    sa.Column('enrollment_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('total_days', sa.Integer(), nullable=False),
+    sa.Column('present_days', sa.Integer(), nullable=False),
+    sa.Column('minutes_total', sa.Integer(), nullable=False),
+    sa.Column('minutes', sa.Integer(), nullable=False),
+    sa.Column('required_pct', sa.Integer(), nullable=False),
+    sa.Column('day_pct', sa.Float(), nullable=False),
+    sa.Column('hours_pct', sa.Float(), nullable=False),
+    sa.Column('eligible_day', sa.Boolean(), nullable=False),
+    sa.Column('eligible_hours', sa.Boolean(), nullable=False),
+    sa.Column('stale', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['enrollment_id'], ['enrollments.id'], name=op.f('fk_enrollment_presence_enrollment_id_enrollments'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], name=op.f('fk_enrollment_presence_event_id_events'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('enrollment_id', name=op.f('pk_enrollment_presence'))
+    )
+    op.create_index('ix_enrollment_presence_event_day', 'enrollment_presence', ['event_id', 'eligible_day'])
+    op.create_index('ix_enrollment_presence_event_hours', 'enrollment_presence', ['event_id', 'eligible_hours'])
+    # sem backfill: linhas ausentes são calculadas na primeira leitura
+
+def downgrade():
+    op.drop_index('ix_enrollment_presence_event_hours', table_name='enrollment_presence')
+    op.drop_index('ix_enrollment_presence_event_day', table_name='enrollment_presence')
+    op.drop_table('enrollment_presence')
@@ -0,0 +1,24 @@
+"""id_sequences: contadores nomeados (códigos de verificação)
+
+Revision ID: 9a4d2e6f0b13
+Revises: 7c1e5d8a2b90
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "9a4d2e6f0b13"
+down_revision = "7c1e5d8a2b90"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('id_sequences',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name', name=op.f('pk_id_sequences'))
+    )
+    op.execute("INSERT INTO id_sequences (name, next_value) VALUES ('verify_code', 1)")
+
+def downgrade():
+    op.drop_table('id_sequences')